@@ -0,0 +1,76 @@
+"""
+Export the weights of a Dense (MLP) evaluator to a .npz file that NeuralNetNumpy can run
+without TensorFlow. The source is either a .tflite file or a Keras model (build_model_2/3/4
+of Models.py) saved with model.save.
+
+    python AI/ExportNumpy.py AI/NueralNet2.tflite AI/NueralNet2.npz
+    python AI/ExportNumpy.py AI/SavedModels/model5 AI/model5.npz
+
+The .npz holds kernel_<k> ([inputs, outputs]) and bias_<k> arrays for every layer, and the
+name of their activations in an "activations" array.
+"""
+import sys
+import numpy as np
+
+
+def layers_from_keras(model):
+    """ (kernel, bias, activation) of the Dense layers of a Keras model """
+    layers = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in ("InputLayer", "Flatten"):
+            continue
+        if kind != "Dense":
+            raise ValueError(f"Only Dense models can be exported, found a {kind} layer")
+        kernel, bias = layer.get_weights()
+        layers.append((kernel, bias, layer.get_config()["activation"]))
+    return layers
+
+
+def layers_from_tflite(model_path):
+    """ (kernel, bias, activation) of the FULLY_CONNECTED ops of a .tflite model """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    interpreter = Interpreter(model_path=model_path)
+    interpreter.allocate_tensors()
+    names = {tensor["index"]: tensor["name"] for tensor in interpreter.get_tensor_details()}
+
+    layers = []
+    for op in interpreter._get_ops_details():
+        if op["op_name"] in ("RESHAPE", "DELEGATE"):
+            continue
+        if op["op_name"] == "FULLY_CONNECTED":
+            _, weights, bias = op["inputs"]
+            # the activation fused into the op only shows in the name of its output tensor
+            activation = "relu" if names[op["outputs"][0]].endswith("Relu") else "linear"
+            # tflite keeps the weights as [outputs, inputs]
+            layers.append((interpreter.get_tensor(weights).T, interpreter.get_tensor(bias), activation))
+        elif op["op_name"] in ("TANH", "LOGISTIC") and layers and layers[-1][2] == "linear":
+            kernel, bias, _ = layers[-1]
+            layers[-1] = (kernel, bias, "tanh" if op["op_name"] == "TANH" else "sigmoid")
+        else:
+            raise ValueError(f"Only Dense models can be exported, found a {op['op_name']} op")
+    return layers
+
+
+def export_layers(layers, npz_path):
+    arrays = {"activations": np.array([activation for _, _, activation in layers])}
+    for k, (kernel, bias, _) in enumerate(layers):
+        arrays[f"kernel_{k}"] = np.asarray(kernel, dtype=np.float32)
+        arrays[f"bias_{k}"] = np.asarray(bias, dtype=np.float32)
+    np.savez(npz_path, **arrays)
+
+
+if __name__ == "__main__":
+    model_path, npz_path = sys.argv[1], sys.argv[2]
+    if model_path.endswith(".tflite"):
+        layers = layers_from_tflite(model_path)
+    else:
+        from tensorflow.keras.models import load_model
+        layers = layers_from_keras(load_model(model_path))
+    export_layers(layers, npz_path)
+    for kernel, bias, activation in layers:
+        print(f"Dense {kernel.shape[0]} -> {kernel.shape[1]}, {activation}")
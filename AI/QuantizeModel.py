@@ -0,0 +1,147 @@
+"""
+Convert a trained SavedModel to TFLite variants and compare their latency and accuracy.
+
+Variants:
+    float     default conversion, the reference
+    dynamic   dynamic-range quantization, int8 weights and float activations
+    int8      full-integer quantization, int8 weights and activations calibrated on a
+              representative dataset drawn from the training split of X.npy. The input and
+              output stay float32, so the model is a drop-in replacement for NeuralNetTFLite.
+    float16   float16 weights
+
+For each variant the script reports the file size, the CPU latency of one invoke at batch 1 and
+at batch N, and the MSE on the held-out split of Train.py (test_size=0.15, random_state=42),
+next to the MSE of the float model and the mean squared difference with its outputs.
+
+Run from the repository root:
+    python AI/QuantizeModel.py --saved-model AI/SavedModels/model5 --output-dir AI/Quantized
+    python AI/QuantizeModel.py --evaluate-only AI/NueralNet2.tflite AI/Quantized/model5_int8.tflite
+"""
+import argparse
+import os
+from time import perf_counter
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+VARIANTS = ("float", "dynamic", "int8", "float16")
+
+
+def load_split(x_path, y_path):
+    """ the train / test split of Train.py """
+    X = np.load(x_path).astype(np.float32)
+    if X.shape[-1] != 6:
+        # datasets built before ReadyDataset.StateEncoder are channels first
+        X = np.transpose(X, (0, 2, 3, 1))
+    Y = np.load(y_path).astype(np.float32)
+    return train_test_split(X, Y, test_size=0.15, random_state=42)
+
+
+def convert(saved_model_path, variant, X_train, calibration_samples=500, seed=0):
+    """ return the TFLite flatbuffer of a variant """
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_path)
+    if variant == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif variant == "int8":
+        rng = np.random.default_rng(seed)
+        samples = X_train[rng.choice(len(X_train), size=min(calibration_samples, len(X_train)), replace=False)]
+
+        def representative_dataset():
+            for sample in samples:
+                yield [sample[np.newaxis]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif variant == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant != "float":
+        raise ValueError(f"Unknown variant: {variant}")
+    return converter.convert()
+
+
+def make_interpreter(model_path, batch_size):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    interpreter = Interpreter(model_path=model_path)
+    input_details = interpreter.get_input_details()[0]
+    interpreter.resize_tensor_input(input_details["index"], [batch_size, *input_details["shape"][1:]])
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+def predict(model_path, X, batch_size):
+    """ outputs of a model on X, in padded batches of batch_size """
+    interpreter = make_interpreter(model_path, batch_size)
+    input_index = interpreter.get_input_details()[0]["index"]
+    output_index = interpreter.get_output_details()[0]["index"]
+    batch = np.zeros((batch_size, *X.shape[1:]), dtype=np.float32)
+    outputs = np.empty(len(X), dtype=np.float32)
+    for start in range(0, len(X), batch_size):
+        chunk = X[start:start + batch_size]
+        batch[:len(chunk)] = chunk
+        interpreter.set_tensor(input_index, batch)
+        interpreter.invoke()
+        outputs[start:start + len(chunk)] = interpreter.get_tensor(output_index)[:len(chunk), 0]
+    return outputs
+
+
+def latency(model_path, X, batch_size, repeat):
+    """ median seconds of one invoke on batch_size states """
+    interpreter = make_interpreter(model_path, batch_size)
+    input_index = interpreter.get_input_details()[0]["index"]
+    batch = np.resize(X, (batch_size, *X.shape[1:])).astype(np.float32)
+    times = []
+    for _ in range(repeat):
+        st = perf_counter()
+        interpreter.set_tensor(input_index, batch)
+        interpreter.invoke()
+        times.append(perf_counter() - st)
+    return float(np.median(times))
+
+
+def report(model_paths, X_test, Y_test, batch_size, repeat):
+    """ print size, latency and accuracy of the models, the first one is the reference """
+    reference = predict(model_paths[0], X_test, batch_size)
+    print(f"{'model':<40} {'KB':>7} {'ms@1':>7} {f'ms@{batch_size}':>8} {'MSE':>9} {'vs first':>9}")
+    for model_path in model_paths:
+        outputs = reference if model_path == model_paths[0] else predict(model_path, X_test, batch_size)
+        print(f"{os.path.basename(model_path):<40} {os.path.getsize(model_path) / 1024:>7.1f} "
+              f"{latency(model_path, X_test, 1, repeat) * 1000:>7.3f} "
+              f"{latency(model_path, X_test, batch_size, repeat) * 1000:>8.3f} "
+              f"{np.mean((outputs - Y_test) ** 2):>9.5f} {np.mean((outputs - reference) ** 2):>9.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saved-model", default=os.path.join("AI", "SavedModels", "model5"))
+    parser.add_argument("--output-dir", default=os.path.join("AI", "Quantized"))
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument("--x", default=os.path.join("AI", "NPYs", "X.npy"))
+    parser.add_argument("--y", default=os.path.join("AI", "NPYs", "Y.npy"))
+    parser.add_argument("--calibration-samples", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=200, help="invokes timed per latency measurement")
+    parser.add_argument("--evaluate-only", nargs="+", metavar="TFLITE",
+                        help="skip the conversion and compare these .tflite files, the first one is the reference")
+    args = parser.parse_args()
+
+    X_train, X_test, Y_train, Y_test = load_split(args.x, args.y)
+    if args.evaluate_only:
+        model_paths = args.evaluate_only
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+        name = os.path.basename(os.path.normpath(args.saved_model))
+        # the float model comes first, it is the reference of the report
+        variants = ["float"] + [variant for variant in args.variants if variant != "float"]
+        model_paths = []
+        for variant in variants:
+            model_path = os.path.join(args.output_dir, f"{name}_{variant}.tflite")
+            with open(model_path, "wb") as f:
+                f.write(convert(args.saved_model, variant, X_train, args.calibration_samples))
+            model_paths.append(model_path)
+    report(model_paths, X_test, Y_test, args.batch_size, args.repeat)
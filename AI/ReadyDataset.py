@@ -43,6 +43,8 @@ def convert_dataset_txt_to_record(txt_path):
                 elif sqr == 'B': new_state.board[i][j] = 'B'
                 elif sqr == 'K': new_state.board[i][j] = 'K'
 
+        # the board was filled after State() hashed it
+        new_state.rehash()
         record.add_state(new_state)
     
     winner_state = data_blocks[-1].strip("\n")
@@ -124,6 +126,7 @@ import numpy as np
 import sys 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from Utils import State, Entity, score_function, LastMoves, score_function_linear
+from BitboardState import BitboardState, iterate_bits
 
 class Record:
     def __init__(self, txt_path=None) -> None:
@@ -169,6 +172,8 @@ def convert_dataset_txt_to_record(txt_path, self_play=False):
                     elif sqr == 'B': new_state.board[i][j] = 'B'
                     elif sqr == 'K': new_state.board[i][j] = 'K'
 
+            # the board was filled after State() hashed it
+            new_state.rehash()
             record.add_state(new_state)
         
         winner_state = data_blocks[-1].strip("\n")
@@ -208,6 +213,8 @@ def convert_dataset_txt_to_record(txt_path, self_play=False):
                     elif sqr == 'B': new_state.board[i][j] = 'B'
                     elif sqr == 'K': new_state.board[i][j] = 'K'
 
+            # the board was filled after State() hashed it
+            new_state.rehash()
             record.add_state(new_state)
         
         winner_state = data_blocks[-1][-1]
@@ -254,6 +261,122 @@ def state_to_nparray(np_camps, np_castle, np_escapes, state:State):
     return output_matrix
 
 
+class StateEncoder:
+    """
+    Encodes states straight into float32 NHWC buffers ([9, 9, 6] or [N, 9, 9, 6]), the planes in
+    the order of state_to_nparray (camps, castle, escapes, W, B, K).
+
+    The terrain planes never change: new_buffer fills them once, and encode only clears and sets
+    the piece planes, from the coordinates of the pieces. No tensor is allocated per call.
+    """
+    PIECE_PLANES = {Entity.white: 3, Entity.black: 4, Entity.king: 5}
+
+    def __init__(self) -> None:
+        np_camps, np_castle, np_escapes = initialize_nps()
+        self.board_shape = np_camps.shape
+        self.terrain = np.stack((np_camps, np_castle, np_escapes), axis=-1).astype(np.float32)
+        # the position the moves of score_moves start from
+        self.parent = self.new_buffer()
+
+    def new_buffer(self, batch_size=None):
+        """ a [9, 9, 6] buffer, or [batch_size, 9, 9, 6], with its terrain planes filled """
+        shape = (*self.board_shape, 6) if batch_size is None else (batch_size, *self.board_shape, 6)
+        buffer = np.zeros(shape, dtype=np.float32)
+        buffer[..., :3] = self.terrain
+        return buffer
+
+    def encode(self, state, buffer):
+        """
+        Write the piece planes of a state into a buffer of new_buffer.
+
+        Args:
+            state (State or BitboardState): The state to encode.
+            buffer (np.ndarray): A [9, 9, 6] buffer, or [1, 9, 9, 6], whose terrain planes are filled.
+        """
+        if isinstance(state, BitboardState):
+            self.encode_batch([state], buffer.reshape(1, *self.board_shape, 6))
+            return buffer
+        # for a single board, a scan is faster than the vectorized piece_indexes
+        buffer[..., 3:] = 0
+        flat = buffer.reshape(-1)
+        width = self.board_shape[1]
+        for i, row in enumerate(state.board):
+            for j, cell in enumerate(row):
+                plane = self.PIECE_PLANES.get(cell)
+                if plane is not None:
+                    flat[(i * width + j) * 6 + plane] = 1
+        return buffer
+
+    def encode_batch(self, states, buffer):
+        """ encode states into the first len(states) rows of a batched buffer and return them """
+        encoded = buffer[:len(states)]
+        encoded[..., 3:] = 0
+        encoded.reshape(-1)[self.piece_indexes(states)] = 1
+        return encoded
+
+    def score_moves(self, state, moves, buffer, score_encoded, cache=None):
+        """
+        Score the states reached by moves from a state without copying it: each move is played on the
+        state and taken back, its position is written into the next row of the buffer as the encoded
+        state plus the changes of the move (the moved piece and the captures of its MoveRecord).
+
+        Args:
+            state (State or BitboardState): The position, moved in place and restored.
+            moves (list): (i, j, new_i, new_j) moves of the player to move.
+            buffer (np.ndarray): A batched buffer of new_buffer, with a row per move at least.
+            score_encoded (callable): Takes the encoded rows and returns their scores.
+            cache (EvaluationCache, optional): Scores already known, by piece_hash. States found in it are
+                not encoded, the new scores are stored in it. Defaults to None.
+
+        Returns:
+            np.ndarray: The score of the state reached by each move, in order.
+        """
+        scores = np.empty(len(moves), dtype=np.float32)
+        missing, keys = [], []
+        self.encode(state, self.parent)
+        width = self.board_shape[1]
+        for k, move in enumerate(moves):
+            record = state.make_move(move)
+            score = cache.lookup(state.piece_hash) if cache is not None else None
+            if score is None:
+                row = buffer[len(missing)]
+                row[...] = self.parent
+                flat = row.reshape(-1)
+                i, j, new_i, new_j = move
+                plane = self.PIECE_PLANES[record.piece]
+                flat[(i * width + j) * 6 + plane] = 0
+                flat[(new_i * width + new_j) * 6 + plane] = 1
+                for captured_i, captured_j, piece in record.captured:
+                    flat[(captured_i * width + captured_j) * 6 + self.PIECE_PLANES[piece]] = 0
+                missing.append(k)
+                keys.append(state.piece_hash)
+            else:
+                scores[k] = score
+            state.unmake_move(record)
+        if missing:
+            new_scores = score_encoded(buffer[:len(missing)])
+            scores[missing] = new_scores
+            if cache is not None:
+                for key, score in zip(keys, new_scores):
+                    cache.store(key, score)
+        return scores
+
+    def piece_indexes(self, states):
+        """ indexes of the piece inputs set to 1 in a flattened [N, 9, 9, 6] tensor of the states """
+        squares_per_board = self.board_shape[0] * self.board_shape[1]
+        if all(isinstance(state, BitboardState) for state in states):
+            indexes = [(k * squares_per_board + square) * 6 + plane
+                       for k, state in enumerate(states)
+                       for mask, plane in ((state.white, 3), (state.black, 4), (state.king, 5))
+                       for square in iterate_bits(mask)]
+            return np.array(indexes, dtype=np.intp)
+        # every square holds a one character Entity, so the boards are read as bytes in one go
+        squares = np.frombuffer("".join("".join(row) for state in states for row in state.board).encode(),
+                                dtype=np.uint8)
+        return np.concatenate([np.flatnonzero(squares == ord(piece)) * 6 + plane
+                               for piece, plane in self.PIECE_PLANES.items()])
+
+
 def list_files(root_dir:str) -> list:
     """takes the path of a folder and returns all txt file paths in it"""
     txt_paths = []
@@ -264,7 +387,6 @@ def list_files(root_dir:str) -> list:
     return txt_paths
 
 if __name__ == "__main__":
-    np_camps, np_castle, np_escapes = initialize_nps()
 
     PreProvidedDatasetPath = r"AI\GameRecords\PreDataset"
     RecordsDatasetPath = r"AI\GameRecords\RecordsDataset"
@@ -286,18 +408,11 @@ if __name__ == "__main__":
         calculate_score(data_record)
         records.append(data_record)
 
-    Xs = []
-    Ys = []
-    for record in records:
-        try:
-            for state in record.states:
-                Ys.append(state.score)
-                state_matrix = state_to_nparray(np_camps, np_castle, np_escapes, state)
-                Xs.append(state_matrix)
-        except: pass 
-
-    Xs = np.array(Xs)
-    Ys = np.array(Ys)
+    # the states are encoded in the NHWC layout the models take
+    encoder = StateEncoder()
+    states = [state for record in records for state in record.states]
+    Xs = encoder.encode_batch(states, encoder.new_buffer(len(states)))
+    Ys = np.array([state.score for state in states])
 
     np.save(r"AI\NPYs\X.npy" ,Xs)
     np.save(r"AI\NPYs\Y.npy", Ys)
@@ -15,7 +15,9 @@ from keras.utils.vis_utils import plot_model
 plot_model(model, to_file='a.png', show_shapes=True, show_layer_names=True)
 
 X = np.load(r"AI\NPYs\X.npy")
-X = np.transpose(X, (0, 2, 3, 1))
+if X.shape[-1] != 6:
+    # datasets built before ReadyDataset.StateEncoder are channels first
+    X = np.transpose(X, (0, 2, 3, 1))
 Y = np.load(r"AI\NPYs\Y.npy")
 
 X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.15, random_state=42)
@@ -0,0 +1,73 @@
+"""
+Compare the ways of scoring the candidate moves of a position with the neural net.
+
+For random mid-game positions the script scores the states reached by every legal move:
+    - TFLite, one invoke per move (NeuralNetTFLite.get_state_score),
+    - TFLite, batched invokes (NeuralNetTFLite.get_state_scores),
+    - TFLite, batched invokes of the moves encoded in place (NeuralNetTFLite.get_move_scores),
+    - NumPy, the same three ways (NeuralNetNumpy, weights from AI/ExportNumpy.py).
+The first two score copies of the position, the time to copy it and play the moves is included.
+It prints the latency of each and the largest difference with the per-move TFLite scores.
+
+Run from the repository root:
+    python Benchmarks/NeuralNetBatch.py --positions 50 --batch-size 64
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from NueralNetTFLite import NeuralNetTFLite
+from NueralNetNumpy import NeuralNetNumpy
+from SearchPruning import random_positions
+
+
+def next_states(state, moves):
+    """ copies of the state, each with one of the moves played """
+    states = []
+    for move in moves:
+        next_state = state.copy()
+        next_state.make_move(move)
+        states.append(next_state)
+    return states
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=50)
+    parser.add_argument("--plies", type=int, default=12, help="random moves played to reach each position")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tflite_engine = NeuralNetTFLite(model_path=os.path.join(ROOT, "AI", "NueralNet2.tflite"), batch_size=args.batch_size)
+    numpy_engine = NeuralNetNumpy(model_path=os.path.join(ROOT, "AI", "NueralNet2.npz"))
+    paths = {
+        "tflite per move": lambda state, moves: [tflite_engine.get_state_score(s) for s in next_states(state, moves)],
+        "tflite batched": lambda state, moves: tflite_engine.get_state_scores(next_states(state, moves)),
+        "tflite in place": tflite_engine.get_move_scores,
+        "numpy per move": lambda state, moves: [numpy_engine.get_state_score(s) for s in next_states(state, moves)],
+        "numpy batched": lambda state, moves: numpy_engine.get_state_scores(next_states(state, moves)),
+        "numpy in place": numpy_engine.get_move_scores,
+    }
+    times = dict.fromkeys(paths, 0.0)
+    max_difference = dict.fromkeys(paths, 0.0)
+    number_of_moves = 0
+    for state, player in random_positions(args.positions, args.plies, args.seed):
+        moves = state.possible_moves(player)
+        number_of_moves += len(moves)
+
+        reference = None
+        for name, score_moves in paths.items():
+            st = perf_counter()
+            scores = score_moves(state, moves)
+            times[name] += perf_counter() - st
+            if reference is None:
+                reference = scores
+            max_difference[name] = max(max_difference[name], max(abs(a - b) for a, b in zip(reference, scores)))
+
+    print(f"{args.positions} positions, {number_of_moves / args.positions:.1f} moves per position")
+    for name in paths:
+        print(f"{name:<16} {times[name] / args.positions * 1000:>7.2f} ms per position "
+              f"({times['tflite per move'] / times[name]:.1f}x), largest score difference {max_difference[name]:.2e}")
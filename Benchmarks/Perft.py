@@ -0,0 +1,169 @@
+"""
+Perft: count the positions reached by every sequence of moves up to a depth, to measure and check
+move generation (possible_moves, and Rules.apply_move / undo_move with the captures).
+
+A move that ends the game (the king escapes or is captured, or the opponent has no move left) has
+no continuation, so it only counts as a leaf at the last ply. The counts are checked against
+REFERENCE_COUNTS with --verify, which exits with status 1 on a mismatch or when unmake_move did not
+restore the starting position: a faster move generation must give exactly the same counts, on both
+State and BitboardState.
+
+Run from the repository root:
+    python Benchmarks/Perft.py --depth 3
+    python Benchmarks/Perft.py --depth 3 --verify --backend bitboard
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Utils import State, Entity, LastMoves
+from BitboardState import BitboardState
+from TablutGame import TablutGame
+from Rules import apply_move, undo_move, opponent
+
+# mid-game positions of random games (SearchPruning.random_positions), with the player to move
+POSITIONS = {
+    "initial": (TablutGame.initial_state, Entity.white),
+    "midgame_1": ([
+        "O**0B0*BO",
+        "*OOOBOOB*",
+        "*WOBOOOO*",
+        "BOOOWOWOB",
+        "BBWWKOW0B",
+        "0OOBWOWOB",
+        "*OOOOOOO*",
+        "BOOO0OOO*",
+        "O**BB0*BO"], Entity.black),
+    "midgame_2": ([
+        "O**BBB**O",
+        "*OBO0OOO*",
+        "*OOOOOOW*",
+        "BWWOBOOO0",
+        "BBOWKWOBB",
+        "BOOOWOBO0",
+        "*OOBWWOO*",
+        "*OBO0OOO*",
+        "O*B00B**O"], Entity.white),
+    "midgame_3": ([
+        "O**BBB**O",
+        "BOWOBOOB*",
+        "*OOOWOOOB",
+        "0BOOOOWO0",
+        "B0OOKWO0B",
+        "BOOOWOOOB",
+        "*OOWOWWO*",
+        "*OOO0OOB*",
+        "B**0B0*BO"], Entity.black),
+    "midgame_4": ([
+        "O**0B0*BO",
+        "BOOO0OOO*",
+        "*OOOOOOO*",
+        "BOOBOBOOB",
+        "BBOOKOW0B",
+        "BOOWOBOOB",
+        "*OWOOOOW*",
+        "BWOO0OOO*",
+        "B**0B0**O"], Entity.white),
+}
+
+# (position, depth) -> number of leaves, the same on State and BitboardState
+REFERENCE_COUNTS = {
+    ("initial", 1): 56,
+    ("initial", 2): 4408,
+    ("initial", 3): 248616,
+    ("initial", 4): 19156832,
+    ("midgame_1", 1): 73,
+    ("midgame_1", 2): 2417,
+    ("midgame_1", 3): 176418,
+    ("midgame_1", 4): 6437493,
+    ("midgame_2", 1): 38,
+    ("midgame_2", 2): 2996,
+    ("midgame_2", 3): 114599,
+    ("midgame_2", 4): 8926007,
+    ("midgame_3", 1): 75,
+    ("midgame_3", 2): 4499,
+    ("midgame_3", 3): 331743,
+    ("midgame_3", 4): 19055944,
+    ("midgame_4", 1): 49,
+    ("midgame_4", 2): 3662,
+    ("midgame_4", 3): 163401,
+    ("midgame_4", 4): 12117121,
+}
+
+
+def make_state(position, backend="state"):
+    """ the state of a position of POSITIONS, a State or a BitboardState """
+    board, player = POSITIONS[position]
+    last_move = LastMoves.black if player == Entity.white else LastMoves.white
+    if position == "initial":
+        last_move = LastMoves.initial_state
+    state = State([list(row) for row in board], last_move=last_move)
+    if backend == "bitboard":
+        state = BitboardState.from_state(state)
+    return state, player
+
+
+def perft(state, player, depth):
+    """
+    Count the leaves of the move tree of a state, depth plies deep.
+
+    Args:
+        state (State or BitboardState): The position, its moves are played and taken back in place.
+        player (Entity): The player to move.
+        depth (int): Number of plies.
+
+    Returns:
+        int: The number of leaves.
+    """
+    moves = state.possible_moves(player)
+    if depth == 1:
+        return len(moves)
+    next_player = opponent(player)
+    leaves = 0
+    for move in moves:
+        # a blocked opponent has no moves below, it needs no check of its own
+        record, winner = apply_move(state, player, move, check_blocked=False)
+        if winner is None:
+            leaves += perft(state, next_player, depth - 1)
+        undo_move(state, record)
+    return leaves
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--positions", nargs="+", choices=POSITIONS, default=list(POSITIONS))
+    parser.add_argument("--backend", choices=["state", "bitboard", "both"], default="both")
+    parser.add_argument("--verify", action="store_true", help="compare the counts with REFERENCE_COUNTS")
+    args = parser.parse_args()
+
+    backends = ["state", "bitboard"] if args.backend == "both" else [args.backend]
+    mismatches = 0
+    totals = {backend: [0, 0.0] for backend in backends}
+    print(f"{'position':<10} {'depth':>5} {'backend':>8} {'leaves':>12} {'seconds':>8} {'leaves/s':>10} {'reference':>10}")
+    for position in args.positions:
+        for depth in range(1, args.depth + 1):
+            for backend in backends:
+                state, player = make_state(position, backend)
+                piece_hash = state.piece_hash
+                st = perf_counter()
+                leaves = perft(state, player, depth)
+                elapsed = perf_counter() - st
+                totals[backend][0] += leaves
+                totals[backend][1] += elapsed
+                reference = REFERENCE_COUNTS.get((position, depth))
+                status = "-" if reference is None else "ok" if reference == leaves else f"!= {reference}"
+                # every move was taken back, the state must be the position it started from
+                if state.piece_hash != piece_hash:
+                    status = "unrestored"
+                if args.verify and status not in ("-", "ok"):
+                    mismatches += 1
+                print(f"{position:<10} {depth:>5} {backend:>8} {leaves:>12} {elapsed:>8.3f} "
+                      f"{leaves / elapsed if elapsed else 0:>10.0f} {status:>10}")
+
+    for backend, (leaves, elapsed) in totals.items():
+        print(f"{backend}: {leaves} leaves in {elapsed:.2f}s, {leaves / elapsed:.0f} leaves/s")
+    if args.verify:
+        print(f"mismatches with the reference counts: {mismatches}")
+        sys.exit(1 if mismatches else 0)
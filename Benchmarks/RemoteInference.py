@@ -0,0 +1,86 @@
+"""
+Compare game processes with their own TFLite engine against processes sharing an InferenceServer.
+
+Every worker process scores the states reached by the legal moves of random mid-game positions,
+one state per call like TablutGame's neural net player, either with a NeuralNetTFLite loaded in the
+process ("local") or with a RemoteNeuralNet client of one server ("remote"). The script prints the
+evaluations per second of all the workers together, their peak memory and the server's batch size.
+
+Run from the repository root:
+    python Benchmarks/RemoteInference.py --workers 8 --positions 20
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+from time import perf_counter
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from InferenceServer import start_server, RemoteNeuralNet
+from SearchPruning import random_positions
+try:
+    import resource
+except ImportError:
+    # Windows, the peak memory is not reported
+    resource = None
+
+
+def worker(mode, address, seed, positions, plies, barrier, results):
+    if mode == "local":
+        from NueralNetTFLite import NeuralNetTFLite
+        engine = NeuralNetTFLite(model_path=os.path.join(ROOT, "AI", "NueralNet2.tflite"), num_threads=1)
+    else:
+        from InferenceServer import RemoteNeuralNet
+        engine = RemoteNeuralNet(address)
+    next_states = []
+    for state, player in random_positions(positions, plies, seed):
+        for move in state.possible_moves(player):
+            next_state = state.copy()
+            next_state.make_move(move)
+            next_states.append(next_state)
+    barrier.wait()
+    st = perf_counter()
+    for next_state in next_states:
+        engine.get_state_score(next_state)
+    elapsed = perf_counter() - st
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else float("nan")
+    results.put((len(next_states), elapsed, peak_memory))
+
+
+def run(mode, address, args):
+    barrier = multiprocessing.Barrier(args.workers)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(mode, address, args.seed + k, args.positions,
+                                                              args.plies, barrier, results))
+                 for k in range(args.workers)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    evaluations = sum(count for count, _, _ in outcomes)
+    elapsed = max(elapsed for _, elapsed, _ in outcomes)
+    peak_memory = sum(memory for _, _, memory in outcomes) / len(outcomes)
+    print(f"{mode:<7} {evaluations / elapsed:>9.0f} evaluations/s, {peak_memory:.1f} MB peak per worker")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--positions", type=int, default=20, help="positions per worker")
+    parser.add_argument("--plies", type=int, default=12, help="random moves played to reach each position")
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-delay", type=float, default=0.002, help="seconds a request waits for others")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run("local", None, args)
+    server, address = start_server(os.path.join(ROOT, "AI", "NueralNet2.tflite"), max_batch=args.max_batch,
+                                   max_delay=args.max_delay)
+    run("remote", address, args)
+    client = RemoteNeuralNet(address)
+    stats = client.server_stats()
+    client.close()
+    print(f"server: {stats['states']} states in {stats['batches']} batches, "
+          f"{stats['states_per_batch']:.1f} states per batch (--max-batch {args.max_batch})")
+    server.terminate()
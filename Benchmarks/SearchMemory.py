@@ -0,0 +1,48 @@
+"""
+Compare the peak memory of a search that keeps the whole tree with a streaming one.
+
+Both searches run on the same random mid-game positions. For each search the script prints
+the peak memory traced by tracemalloc and the nodes visited, and it checks that both pick the
+same root move with the same root score.
+
+Run from the repository root:
+    python Benchmarks/SearchMemory.py --positions 5 --depth 3
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Player import Node, Tree
+from SearchPruning import random_positions
+
+
+def run_search(state, player, depth, streaming):
+    tracemalloc.start()
+    tree = Tree(Node(state=state.copy(), player=player), maximum_depth=depth, for_player=player,
+                streaming=streaming)
+    tree.search_tree(tree.root)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tree.get_best_node(), tree.root.score, tree.nodes_visited, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--plies", type=int, default=12, help="random moves played to reach each position")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mismatches = 0
+    print(f"{'#':>3} {'player':>6} {'nodes':>9} {'whole tree MB':>14} {'streaming MB':>13} {'same move':>9}")
+    for n, (state, player) in enumerate(random_positions(args.positions, args.plies, args.seed)):
+        whole = run_search(state, player, args.depth, streaming=False)
+        streaming = run_search(state, player, args.depth, streaming=True)
+        same = whole[:2] == streaming[:2]
+        mismatches += not same
+        print(f"{n:>3} {player:>6} {whole[2]:>9} {whole[3] / 2**20:>14.2f} {streaming[3] / 2**20:>13.2f} {str(same):>9}")
+
+    print(f"root move or score mismatches: {mismatches}")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,82 @@
+"""
+Compare the plain Mean-Max search with its Star1 pruned variant.
+
+Both searches run on the same random mid-game positions, for both players. For each search
+the script prints the nodes visited and the time, and it checks that both pick the same root
+move with the same root score.
+
+Run from the repository root:
+    python Benchmarks/SearchPruning.py --positions 20 --depth 3
+"""
+import argparse
+import os
+import random
+import sys
+from time import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Utils import State, Entity, LastMoves
+from TablutGame import TablutGame
+from Player import Node, Tree
+from Rules import apply_move, opponent
+
+
+def random_positions(number_of_positions, plies, seed=0):
+    """
+    Play random games from the initial state and keep the position reached after `plies` or
+    `plies` + 1 moves, so that both players get positions to move in.
+
+    Returns:
+        list: (state, player_to_move) pairs, games that end before `plies` moves are skipped.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < number_of_positions:
+        state = State([row[:] for row in TablutGame.initial_state], last_move=LastMoves.initial_state)
+        player = Entity.white
+        for _ in range(plies + rng.randint(0, 1)):
+            moves = state.possible_moves(player)
+            if not moves: break
+            _, winner = apply_move(state, player, rng.choice(moves), check_blocked=False)
+            if winner is not None: break
+            player = opponent(player)
+        else:
+            positions.append((state, player))
+    return positions
+
+
+def run_search(state, player, depth, pruned):
+    tree = Tree(Node(state=state.copy(), player=player), maximum_depth=depth, for_player=player)
+    st = time()
+    if pruned:
+        tree.search_tree_pruned(tree.root)
+    else:
+        tree.search_tree(tree.root)
+    return tree.get_best_node(), tree.root.score, tree.nodes_visited, time() - st
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=20)
+    parser.add_argument("--plies", type=int, default=12, help="random moves played to reach each position")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    totals = {False: [0, 0.0], True: [0, 0.0]}
+    mismatches = 0
+    print(f"{'#':>3} {'player':>6} {'mean-max nodes':>15} {'pruned nodes':>13} {'saved':>7} {'same move':>9}")
+    for n, (state, player) in enumerate(random_positions(args.positions, args.plies, args.seed)):
+        plain = run_search(state, player, args.depth, pruned=False)
+        pruned = run_search(state, player, args.depth, pruned=True)
+        same = plain[:2] == pruned[:2]
+        mismatches += not same
+        for is_pruned, result in ((False, plain), (True, pruned)):
+            totals[is_pruned][0] += result[2]
+            totals[is_pruned][1] += result[3]
+        print(f"{n:>3} {player:>6} {plain[2]:>15} {pruned[2]:>13} {1 - pruned[2] / plain[2]:>7.1%} {str(same):>9}")
+
+    print(f"\nmean-max: {totals[False][0]} nodes in {totals[False][1]:.2f}s")
+    print(f"pruned:   {totals[True][0]} nodes in {totals[True][1]:.2f}s "
+          f"({1 - totals[True][0] / totals[False][0]:.1%} fewer nodes)")
+    print(f"root move or score mismatches: {mismatches}")
+    sys.exit(1 if mismatches else 0)
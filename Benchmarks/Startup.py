@@ -0,0 +1,68 @@
+"""
+Measure the startup cost of each play mode: the time to import TablutGame, the time to
+create what the mode needs and play its first move, and which heavy modules got loaded.
+
+Every mode runs in a fresh Python process, so nothing is imported beforehand:
+    random       a random move, no neural net and no rendering
+    next_best_nn the neural net move selector (NeuralNetTFLite)
+    agent        the tree search agent with the TFLite backend
+    agent_numpy  the tree search agent with the NumPy backend
+    render       loading the pygame images of the board
+
+Run from the repository root:
+    python Benchmarks/Startup.py --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_MOVES = {
+    "random": "import random; random.choice(state.possible_moves(Entity.white))",
+    "next_best_nn": ("from NueralNetTFLite import NeuralNetTFLite; "
+                     "engine = NeuralNetTFLite(model_path=os.path.join('AI', 'NueralNet2.tflite')); "
+                     "engine.get_state_scores([state])"),
+    "agent": "from Player import Agent; Agent(Entity.white).play_best_move(state)",
+    "agent_numpy": "from Player import Agent; Agent(Entity.white, nn_backend='numpy').play_best_move(state)",
+    "render": "from Utils import get_square_images; get_square_images()",
+}
+
+SCRIPT = """
+import json, os, sys
+from time import perf_counter
+st = perf_counter()
+from TablutGame import TablutGame
+from Utils import State, Entity, LastMoves
+import_time = perf_counter() - st
+state = State([row[:] for row in TablutGame.initial_state], last_move=LastMoves.initial_state)
+st = perf_counter()
+{first_move}
+first_move_time = perf_counter() - st
+print(json.dumps({{"import": import_time, "first_move": first_move_time,
+                  "modules": [m for m in ("pygame", "PIL", "tensorflow", "tflite_runtime") if m in sys.modules]}}))
+"""
+
+
+def run_mode(mode):
+    env = dict(os.environ, SDL_VIDEODRIVER=os.environ.get("SDL_VIDEODRIVER", "dummy"))
+    output = subprocess.run([sys.executable, "-c", SCRIPT.format(first_move=FIRST_MOVES[mode])], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="processes started per mode, the best time is kept")
+    parser.add_argument("--modes", nargs="+", default=list(FIRST_MOVES), choices=list(FIRST_MOVES))
+    args = parser.parse_args()
+
+    print(f"{'mode':<13} {'import ms':>10} {'first move ms':>14}  modules loaded")
+    for mode in args.modes:
+        results = [run_mode(mode) for _ in range(args.repeat)]
+        import_time = min(result["import"] for result in results)
+        first_move_time = min(result["first_move"] for result in results)
+        modules = ", ".join(results[0]["modules"]) or "-"
+        print(f"{mode:<13} {import_time * 1000:>10.1f} {first_move_time * 1000:>14.1f}  {modules}")
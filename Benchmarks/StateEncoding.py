@@ -0,0 +1,57 @@
+"""
+Compare the encoding of states into the network input: the old path (state_to_nparray, then
+expand_dims, a transpose and a float32 copy) with StateEncoder writing into a preallocated buffer.
+
+Both are timed on random mid-game positions, one state at a time and in batches, for State and
+BitboardState, and the script checks that they produce the same tensors.
+
+Run from the repository root:
+    python Benchmarks/StateEncoding.py --positions 200
+"""
+import argparse
+import os
+import sys
+from timeit import timeit
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from AI.ReadyDataset import StateEncoder, state_to_nparray, initialize_nps
+from BitboardState import BitboardState
+from SearchPruning import random_positions
+
+
+def old_encoding(np_planes, state):
+    np_mat = state_to_nparray(*np_planes, state=state)
+    np_mat = np.expand_dims(np_mat, axis=0)
+    return np.transpose(np_mat, (0, 2, 3, 1)).astype(np.float32)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=200)
+    parser.add_argument("--plies", type=int, default=12, help="random moves played to reach each position")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    np_planes = initialize_nps()
+    encoder = StateEncoder()
+    single = encoder.new_buffer(batch_size=1)
+    batch = encoder.new_buffer(batch_size=args.positions)
+    states = [state for state, _ in random_positions(args.positions, args.plies, args.seed)]
+
+    for name, backend_states in (("State", states), ("BitboardState", [BitboardState.from_state(s) for s in states])):
+        reference = np.concatenate([old_encoding(np_planes, state) for state in states])
+        same = np.array_equal(reference, encoder.encode_batch(backend_states, batch)) and all(
+            np.array_equal(reference[k:k + 1], encoder.encode(state, single)) for k, state in enumerate(backend_states))
+
+        old_single = timeit(lambda: [old_encoding(np_planes, state) for state in backend_states], number=args.repeat)
+        new_single = timeit(lambda: [encoder.encode(state, single) for state in backend_states], number=args.repeat)
+        old_batch = timeit(lambda: np.concatenate([old_encoding(np_planes, state) for state in backend_states]),
+                           number=args.repeat)
+        new_batch = timeit(lambda: encoder.encode_batch(backend_states, batch), number=args.repeat)
+        per_state = 1e6 / (args.repeat * len(states))
+        print(f"{name}: same tensors {same}")
+        print(f"  one state:  old {old_single * per_state:6.1f} us, encoder {new_single * per_state:6.1f} us "
+              f"({old_single / new_single:.1f}x)")
+        print(f"  batch:      old {old_batch * per_state:6.1f} us, encoder {new_batch * per_state:6.1f} us per state "
+              f"({old_batch / new_batch:.1f}x)")
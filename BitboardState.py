@@ -0,0 +1,363 @@
+from Utils import Entity, LastMoves, State, MoveRecord, EMPTY_BOARD, ZOBRIST_PIECES, ZOBRIST_BLACK_TO_MOVE
+
+BOARD_SIZE = 9
+NUMBER_OF_SQUARES = BOARD_SIZE * BOARD_SIZE
+
+### Precomputed board geometry. A square (i, j) is stored as bit i*9+j of an 81-bit integer.
+def square_index(i, j):
+    return i * BOARD_SIZE + j
+
+def terrain_mask(entity):
+    mask = 0
+    for i, row in enumerate(EMPTY_BOARD):
+        for j, cell in enumerate(row):
+            if cell == entity:
+                mask |= 1 << square_index(i, j)
+    return mask
+
+CAMPS = terrain_mask(Entity.camp)
+CASTLE = terrain_mask(Entity.castle)
+ESCAPES = terrain_mask(Entity.escape)
+CENTER = square_index(BOARD_SIZE // 2, BOARD_SIZE // 2)
+MIDDLE_OF_CAMPS = sum(1 << square_index(i, j) for i, j in [(0,4),(4,0),(4,8),(8,4)])
+
+# Same enumeration order as State.possible_moves_for_index: right, left, down, up
+DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+# right and down rays run towards higher bit indexes, so their nearest blocker is the lowest set bit
+ASCENDING_DIRECTIONS = (0, 2)
+
+RAY_MASKS = [[0] * NUMBER_OF_SQUARES for _ in DIRECTIONS]
+RAY_MOVES = [[[] for _ in range(NUMBER_OF_SQUARES)] for _ in DIRECTIONS]
+for d, (di, dj) in enumerate(DIRECTIONS):
+    for i in range(BOARD_SIZE):
+        for j in range(BOARD_SIZE):
+            sq = square_index(i, j)
+            new_i, new_j = i + di, j + dj
+            while 0 <= new_i < BOARD_SIZE and 0 <= new_j < BOARD_SIZE:
+                RAY_MASKS[d][sq] |= 1 << square_index(new_i, new_j)
+                RAY_MOVES[d][sq].append((i, j, new_i, new_j))
+                new_i, new_j = new_i + di, new_j + dj
+RAY_STEPS = [abs(di) * BOARD_SIZE + abs(dj) for di, dj in DIRECTIONS]
+
+NEIGHBOURS = [0] * NUMBER_OF_SQUARES
+for i in range(BOARD_SIZE):
+    for j in range(BOARD_SIZE):
+        for di, dj in DIRECTIONS:
+            if 0 <= i + di < BOARD_SIZE and 0 <= j + dj < BOARD_SIZE:
+                NEIGHBOURS[square_index(i, j)] |= 1 << square_index(i + di, j + dj)
+CASTLE_NEIGHBOURS = NEIGHBOURS[CENTER]
+#####################################################################################
+
+
+def iterate_bits(mask):
+    """yield the square indexes of the set bits of a mask, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitboardState:
+
+    def __init__(self, white=0, black=0, king=0, last_move=None) -> None:
+        """
+        Initialize a bitboard state of the Tablut game.
+
+        The pieces are kept as 81-bit integer masks, the terrain (camps, castle, escapes) is
+        shared by all states through the module level masks.
+
+        Args:
+            white (int, optional): Mask of the white soldiers. Defaults to 0.
+            black (int, optional): Mask of the black soldiers. Defaults to 0.
+            king (int, optional): Mask of the king. Defaults to 0.
+            last_move (LastMoves, optional): Last move made in the game. Defaults to None.
+        """
+        self.white = white
+        self.black = black
+        self.king = king
+        self.last_move = last_move
+        self.score = None
+        self.rehash()
+
+    @property
+    def zobrist_hash(self):
+        """ 64-bit Zobrist key of the position, equal to State.zobrist_hash of the same position """
+        if self.last_move == LastMoves.white:
+            return self.piece_hash ^ ZOBRIST_BLACK_TO_MOVE
+        return self.piece_hash
+
+    def rehash(self):
+        """ recompute piece_hash from the masks """
+        self.piece_hash = 0
+        for mask, entity in ((self.white, Entity.white), (self.black, Entity.black), (self.king, Entity.king)):
+            for sq in iterate_bits(mask):
+                self.piece_hash ^= ZOBRIST_PIECES[entity][sq]
+
+    @classmethod
+    def from_state(cls, state:State):
+        """
+        Build a bitboard state from a list based State.
+
+        Args:
+            state (State): The state to convert.
+
+        Returns:
+            BitboardState: Equivalent bitboard state.
+        """
+        masks = {Entity.white: 0, Entity.black: 0, Entity.king: 0}
+        for i, row in enumerate(state.board):
+            for j, cell in enumerate(row):
+                if cell in masks:
+                    masks[cell] |= 1 << square_index(i, j)
+        return cls(masks[Entity.white], masks[Entity.black], masks[Entity.king], last_move=state.last_move)
+
+    def copy(self):
+        """ return a new BitboardState with the same pieces """
+        return BitboardState(self.white, self.black, self.king, last_move=self.last_move)
+
+    def to_state(self):
+        """ return an equivalent list based State """
+        return State(self.board, last_move=self.last_move)
+
+    @property
+    def board(self):
+        """
+        9x9 list of one-character strings, same format as State.board.
+        It is rebuilt on every access, so avoid it in hot loops.
+        """
+        board = [row[:] for row in EMPTY_BOARD]
+        for mask, entity in ((self.white, Entity.white), (self.black, Entity.black), (self.king, Entity.king)):
+            for sq in iterate_bits(mask):
+                i, j = divmod(sq, BOARD_SIZE)
+                board[i][j] = entity
+        return board
+
+    def __str__(self) -> str:
+        return str(self.to_state())
+
+    def piece_at(self, i, j):
+        """
+        Return the entity at a square, indexed the same way as State.board[i][j]:
+        negative indexes wrap around and indexes past the board raise IndexError.
+        """
+        if i >= BOARD_SIZE or j >= BOARD_SIZE or i < -BOARD_SIZE or j < -BOARD_SIZE:
+            raise IndexError("square outside of the board")
+        bit = 1 << square_index(i % BOARD_SIZE, j % BOARD_SIZE)
+        if self.white & bit: return Entity.white
+        if self.black & bit: return Entity.black
+        if self.king & bit: return Entity.king
+        if CAMPS & bit: return Entity.camp
+        if CASTLE & bit: return Entity.castle
+        if ESCAPES & bit: return Entity.escape
+        return Entity.square
+
+    def if_black_captured_king(self, i, j):
+        """check if a move by black has the king captured
+        Args:
+            i (int): new_move_i_index
+            j (int): new_move_j_index
+        Returns:
+            bool: has king been captured?
+        """
+        if self.last_move == LastMoves.black:
+            if self.if_king_captured(i, j): return True
+        return False
+
+    def where_is_king(self):
+        """return position of king"""
+        if self.king:
+            return divmod(self.king.bit_length() - 1, BOARD_SIZE)
+
+    def if_king_escaped(self, i, j):
+        """
+        Check if the king has escaped due to a move by white.
+
+        Args:
+            i (int): New move row index.
+            j (int): New move column index.
+
+        Returns:
+            bool: True if the king has escaped, False otherwise.
+        """
+        if self.last_move == LastMoves.white:
+            bit = 1 << square_index(i, j)
+            if self.king & bit and ESCAPES & bit:
+                return True
+        return False
+
+    def if_king_captured(self, c_i, c_j):
+        """
+        Check if the king has been captured, with the same rules as State.if_king_captured.
+
+        Args:
+            c_i (int): Row index of the last moved black piece.
+            c_j (int): Column index of the last moved black piece.
+
+        Returns:
+            bool: True if the king has been captured, False otherwise.
+        """
+        if not self.king:
+            return False
+        king_square = self.king.bit_length() - 1
+        if king_square == CENTER:
+            # King is in the castle, it must be surrounded by black pieces on all four sides
+            return CASTLE_NEIGHBOURS & ~self.black == 0
+        if self.king & CASTLE_NEIGHBOURS:
+            # King is next to the castle, it must be surrounded by three black pieces and the castle
+            return NEIGHBOURS[king_square] & ~(self.black | CASTLE) == 0
+
+        for rl, ud in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
+            try:
+                if self.piece_at(c_i + ud, c_j + rl) == Entity.king:
+                    return self.piece_at(c_i + 2*ud, c_j + 2*rl) == Entity.black
+            except IndexError: return False
+        return False
+
+    def check_if_index_is_inside_board(self, i, j):
+        ## Check whether index is inside the board
+        return 0 <= i < BOARD_SIZE and 0 <= j < BOARD_SIZE
+
+    def possible_moves(self, for_player=Entity.white):
+        """
+        Get a list of possible moves for the specified player.
+        Args:
+            for_player: The player for whom to find possible moves (Entity.white or Entity.black).
+        Returns:
+            A list of possible move tuples, each containing (i, j, new_i, new_j).
+        """
+        if for_player == Entity.white:
+            pieces = self.white | self.king
+        elif for_player == Entity.black:
+            pieces = self.black
+
+        possible_states = []
+        for sq in iterate_bits(pieces):
+            possible_states.extend(self._moves_for_square(sq))
+        return possible_states
+
+    def possible_moves_for_index(self, i, j):
+        """
+        Get a list of possible moves for the piece at the specified index.
+        Args:
+            i: Row index of the piece.
+            j: Column index of the piece.
+        Returns:
+            A list of possible move tuples, each containing (i, j, new_i, new_j).
+        """
+        return self._moves_for_square(square_index(i, j))
+
+    def _moves_for_square(self, sq):
+        """ slide along the four precomputed rays until the nearest blocker """
+        blockers = self.white | self.black | self.king | CASTLE
+        bit = 1 << sq
+        if not (self.black & bit and MIDDLE_OF_CAMPS & bit):
+            blockers |= CAMPS
+
+        possible_states = []
+        for d in range(4):
+            hit = RAY_MASKS[d][sq] & blockers
+            if not hit:
+                possible_states.extend(RAY_MOVES[d][sq])
+                continue
+            if d in ASCENDING_DIRECTIONS:
+                nearest = (hit & -hit).bit_length() - 1
+            else:
+                nearest = hit.bit_length() - 1
+            reachable = abs(nearest - sq) // RAY_STEPS[d] - 1
+            possible_states.extend(RAY_MOVES[d][sq][:reachable])
+        return possible_states
+
+    def capture_pieces(self, i, j, player):
+        """
+        Remove the pieces captured by a piece of `player` that has just landed on (i, j),
+        with the same rules as State.capture_pieces.
+
+        Args:
+            i (int): Row index of the moved piece.
+            j (int): Column index of the moved piece.
+            player (Entity): The player who made the move (Entity.white or Entity.black).
+
+        Returns:
+            list: (i, j, piece) of every captured piece.
+        """
+        occupied = self.white | self.black | self.king
+        if player == Entity.white:
+            opponents = self.black
+            helpers = self.white | self.king | (CASTLE & ~occupied)
+        elif player == Entity.black:
+            # an empty castle neither stops nor closes a capture by black
+            opponents = self.white | (CASTLE & ~occupied)
+            helpers = self.black | (CAMPS & ~occupied)
+
+        captured_mask = 0
+        sq = square_index(i, j)
+        for d in range(4):
+            passed = 0
+            for _, _, new_i, new_j in RAY_MOVES[d][sq]:
+                bit = 1 << square_index(new_i, new_j)
+                if opponents & bit:
+                    passed |= bit
+                elif helpers & bit:
+                    captured_mask |= passed
+                    break
+                else: break
+
+        captured = []
+        if player == Entity.white:
+            captured_mask &= self.black
+            self.black &= ~captured_mask
+            captured_entity = Entity.black
+        else:
+            captured_mask &= self.white
+            self.white &= ~captured_mask
+            captured_entity = Entity.white
+        for captured_sq in iterate_bits(captured_mask):
+            captured.append(divmod(captured_sq, BOARD_SIZE) + (captured_entity,))
+            self.piece_hash ^= ZOBRIST_PIECES[captured_entity][captured_sq]
+        return captured
+
+    def make_move(self, move_indexes:tuple):
+        """
+        Play a move in place, including the captures it makes.
+
+        Args:
+            move_indexes (tuple): The move to play (i, j, new_i, new_j).
+
+        Returns:
+            MoveRecord: The record to pass to unmake_move to take the move back.
+        """
+        i, j, new_i, new_j = move_indexes
+        source = 1 << square_index(i, j)
+        moved = source | (1 << square_index(new_i, new_j))
+        if self.white & source:
+            piece, player = Entity.white, Entity.white
+            self.white ^= moved
+        elif self.king & source:
+            piece, player = Entity.king, Entity.white
+            self.king ^= moved
+        else:
+            piece, player = Entity.black, Entity.black
+            self.black ^= moved
+        record = MoveRecord(move_indexes, piece, self.last_move, None, self.piece_hash)
+        self.piece_hash ^= ZOBRIST_PIECES[piece][square_index(i, j)] ^ ZOBRIST_PIECES[piece][square_index(new_i, new_j)]
+        self.last_move = player
+        record.captured = self.capture_pieces(new_i, new_j, player)
+        return record
+
+    def unmake_move(self, record:MoveRecord):
+        """
+        Take back a move played with make_move, restoring the captured pieces.
+
+        Args:
+            record (MoveRecord): The record returned by make_move.
+        """
+        i, j, new_i, new_j = record.move_indexes
+        for row, col, piece in record.captured:
+            if piece == Entity.white: self.white |= 1 << square_index(row, col)
+            else: self.black |= 1 << square_index(row, col)
+        moved = (1 << square_index(i, j)) | (1 << square_index(new_i, new_j))
+        if record.piece == Entity.white: self.white ^= moved
+        elif record.piece == Entity.king: self.king ^= moved
+        else: self.black ^= moved
+        self.last_move = record.last_move
+        self.piece_hash = record.piece_hash
@@ -0,0 +1,61 @@
+import os
+import threading
+from EvaluationCache import EvaluationCache
+
+# engines loaded by this process, by (backend, model path, number of threads)
+_engines = {}
+_lock = threading.Lock()
+
+
+def get_engine(model_path, backend="tflite", num_threads=None, cache=None):
+    """
+    Return the neural net engine of a model, loading it the first time it is asked for.
+
+    Every Agent and TablutGame of a process share one engine per model, instead of each loading
+    and warming up its own interpreters. The engines serialize their calls with a lock, so they
+    can be shared between threads. The EvaluationCache of the scores belongs to the engine too: it
+    is set when the engine is loaded and shared by everyone using the engine, games after games.
+
+    Args:
+        model_path (str): Path of the model, a .tflite file or a .npz file of AI/ExportNumpy.py. For the
+            "remote" backend, the address of an InferenceServer.
+        backend (str, optional): "tflite" (NeuralNetTFLite), "numpy" (NeuralNetNumpy) or "remote"
+            (RemoteNeuralNet, a client of an InferenceServer). Defaults to "tflite".
+        num_threads (int, optional): Threads of the TFLite interpreters, None lets TFLite choose. Engines with
+            different thread counts are loaded separately. Defaults to None.
+        cache (EvaluationCache, optional): Cache of the scores of a newly loaded engine. Defaults to None
+            (a new EvaluationCache).
+
+    Raises:
+        ValueError: When a different cache is given for an engine already loaded.
+
+    Returns:
+        NeuralNetTFLite, NeuralNetNumpy or RemoteNeuralNet: The shared engine.
+    """
+    key = (backend, model_path if backend == "remote" else os.path.abspath(model_path), num_threads)
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            if backend == "tflite":
+                from NueralNetTFLite import NeuralNetTFLite
+                engine = NeuralNetTFLite(model_path=model_path, num_threads=num_threads)
+            elif backend == "numpy":
+                from NueralNetNumpy import NeuralNetNumpy
+                engine = NeuralNetNumpy(model_path=model_path)
+            elif backend == "remote":
+                from InferenceServer import RemoteNeuralNet
+                engine = RemoteNeuralNet(address=model_path)
+            else:
+                raise ValueError(f"Unknown neural net backend: {backend}")
+            engine.cache = cache if cache is not None else EvaluationCache()
+            _engines[key] = engine
+        elif cache is not None and cache is not engine.cache:
+            raise ValueError(f"The {backend} engine of {model_path} already has its own cache, "
+                             "use engine.cache instead of a new one")
+    return engine
+
+
+def clear_engines():
+    """ forget the loaded engines, the next get_engine calls load them again """
+    with _lock:
+        _engines.clear()
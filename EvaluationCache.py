@@ -0,0 +1,76 @@
+from collections import OrderedDict
+
+
+class EvaluationCache:
+    def __init__(self, max_entries=2**16) -> None:
+        """
+        Least recently used cache of neural net scores, keyed by the piece_hash of the boards.
+
+        The score of the neural net only depends on the pieces on the board (the terrain never
+        changes), so the Zobrist hash of the pieces is a compact key for it. Every engine loaded by
+        EngineRegistry.get_engine owns one, shared by all the agents and games using the engine.
+
+        Args:
+            max_entries (int, optional): Number of scores kept, the least recently used one is evicted
+                beyond it. Defaults to 2**16.
+        """
+        self.max_entries = max_entries
+        self.scores = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """ return the cached score of a board key, or None """
+        score = self.scores.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.scores.move_to_end(key)
+        self.hits += 1
+        return score
+
+    def store(self, key, score):
+        """ cache the score of a board key, evicting the least recently used one if the cache is full """
+        self.scores[key] = score
+        self.scores.move_to_end(key)
+        if len(self.scores) > self.max_entries:
+            self.scores.popitem(last=False)
+            self.evictions += 1
+
+    def score_states(self, states, score_function):
+        """
+        Score states, looking them up first and passing only the missing ones to score_function.
+
+        Args:
+            states (list): The states to score.
+            score_function (callable): Takes a list of states and returns their scores.
+
+        Returns:
+            list: The score of each state, in order.
+        """
+        scores = [self.lookup(state.piece_hash) for state in states]
+        missing = [k for k, score in enumerate(scores) if score is None]
+        if missing:
+            new_scores = score_function([states[k] for k in missing])
+            for k, score in zip(missing, new_scores):
+                scores[k] = score
+                self.store(states[k].piece_hash, score)
+        return scores
+
+    def clear(self):
+        """ empty the cache, counters are kept """
+        self.scores.clear()
+
+    def stats(self):
+        """ return the counters of the cache as a dict """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.scores),
+            "max_entries": self.max_entries,
+        }
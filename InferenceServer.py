@@ -0,0 +1,295 @@
+from AI.ReadyDataset import StateEncoder
+from EngineRegistry import get_engine
+from multiprocessing.connection import Listener, Client, wait
+import multiprocessing
+import numpy as np
+import threading
+import os
+from time import perf_counter, sleep
+
+# number of states of a request asking for the counters of the server, see RemoteNeuralNet.server_stats
+STATS_REQUEST = -1
+# environment variable passing the key of the server started by start_server to its clients, hex encoded
+AUTHKEY_ENV = "TABLUT_INFERENCE_AUTHKEY"
+
+
+class InferenceServer:
+    def __init__(self, model_path, backend="tflite", address=None, authkey=None, max_batch=256,
+                 max_delay=0.002, num_threads=None) -> None:
+        """
+        A neural net engine serving the game processes of a machine, so they don't each load a model
+        and score their boards one at a time.
+
+        The clients (RemoteNeuralNet) send the piece indexes of their states (see
+        StateEncoder.piece_indexes) over a multiprocessing connection, a Unix socket on Linux and a
+        named pipe on Windows. The server gathers the requests of all the clients into one batch, until
+        it holds max_batch states or max_delay seconds passed since the first request, scores the batch
+        with a single engine and sends each client its scores.
+
+        The connections unpickle nothing, but only the clients knowing the key of the server are
+        accepted: it is random for every server unless one is given, see start_server.
+
+        Args:
+            model_path (str): Path of the model, see EngineRegistry.get_engine.
+            backend (str, optional): "tflite" or "numpy". Defaults to "tflite".
+            address (str, optional): Address to listen on, None picks a free one. Defaults to None.
+            authkey (bytes, optional): Key the clients authenticate with. Defaults to None (32 random bytes).
+            max_batch (int, optional): States scored per batch, a single larger request is still scored
+                in one go. Defaults to 256.
+            max_delay (float, optional): Seconds a request waits for others to join its batch. Defaults to 0.002.
+            num_threads (int, optional): Threads of the TFLite interpreters. Defaults to None.
+        """
+        self.engine = get_engine(model_path, backend=backend, num_threads=num_threads)
+        self.encoder = StateEncoder()
+        self.buffer = self.encoder.new_buffer(batch_size=max_batch)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.authkey = authkey if authkey is not None else os.urandom(32)
+        self.listener = Listener(address=address, authkey=self.authkey)
+        self.address = self.listener.address
+
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.running = False
+
+        self.requests = 0
+        self.batches = 0
+        self.states = 0
+
+    def serve_forever(self):
+        """ accept clients in a thread and score their requests until stop is called """
+        self.running = True
+        threading.Thread(target=self.accept_clients, daemon=True).start()
+        while self.running:
+            with self.connections_lock:
+                connections = list(self.connections)
+            # the connections list is refreshed at least every 50 ms, to pick up new clients
+            pending = self.read_requests(wait(connections, timeout=0.05) if connections else [])
+            if not pending:
+                if not connections:
+                    sleep(0.05)
+                continue
+            deadline = perf_counter() + self.max_delay
+            # connections that failed in read_requests are closed and can't be waited on
+            waiting = [connection for connection in connections
+                       if connection not in {c for c, _, _ in pending} and not connection.closed]
+            # a client has one request in flight at most, so only the others can join the batch
+            while waiting and sum(count for _, count, _ in pending) < self.max_batch:
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    break
+                ready = wait(waiting, timeout=remaining)
+                if not ready:
+                    break
+                pending += self.read_requests(ready)
+                waiting = [connection for connection in waiting if connection not in ready]
+            self.score_requests(pending)
+
+    def accept_clients(self):
+        while self.running:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue
+            with self.connections_lock:
+                self.connections.append(connection)
+
+    def read_requests(self, connections):
+        """
+        return (connection, number of states, piece indexes) of the requests of ready connections,
+        the requests for the counters of the server are answered right away
+        """
+        requests = []
+        for connection in connections:
+            try:
+                message = np.frombuffer(connection.recv_bytes(), dtype=np.int32)
+                if message[0] == STATS_REQUEST:
+                    stats = self.stats()
+                    connection.send_bytes(np.array([stats["requests"], stats["batches"], stats["states"]],
+                                                   dtype=np.int64).tobytes())
+                    continue
+            except (EOFError, OSError):
+                self.close_connection(connection)
+                continue
+            requests.append((connection, int(message[0]), message[1:]))
+        return requests
+
+    def score_requests(self, requests):
+        """ score the states of the requests in one batch and answer each client """
+        total = sum(count for _, count, _ in requests)
+        if total > len(self.buffer):
+            self.buffer = self.encoder.new_buffer(batch_size=total)
+        encoded = self.buffer[:total]
+        encoded[..., 3:] = 0
+        # the indexes of a request are offset by the inputs of the states before it in the batch
+        inputs_per_state = self.buffer[0].size
+        flat = encoded.reshape(-1)
+        offset = 0
+        for _, count, indexes in requests:
+            flat[indexes + offset * inputs_per_state] = 1
+            offset += count
+        scores = self.engine.score_encoded(encoded)
+
+        offset = 0
+        for connection, count, _ in requests:
+            try:
+                connection.send_bytes(scores[offset:offset + count].astype(np.float32).tobytes())
+            except (EOFError, OSError):
+                self.close_connection(connection)
+            offset += count
+        self.requests += len(requests)
+        self.batches += 1
+        self.states += total
+
+    def close_connection(self, connection):
+        with self.connections_lock:
+            if connection in self.connections:
+                self.connections.remove(connection)
+        connection.close()
+
+    def stop(self):
+        self.running = False
+        self.listener.close()
+
+    def stats(self):
+        """ return the counters of the server as a dict """
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "states": self.states,
+            "states_per_batch": self.states / self.batches if self.batches else 0.0,
+        }
+
+
+def _serve(address_pipe, model_path, kwargs):
+    server = InferenceServer(model_path, **kwargs)
+    address_pipe.send(server.address)
+    address_pipe.close()
+    server.serve_forever()
+
+
+def start_server(model_path, **kwargs):
+    """
+    Start an InferenceServer in a daemon process.
+
+    The key of the server is random unless authkey is given. It is exported to the AUTHKEY_ENV
+    environment variable of this process, so the RemoteNeuralNet of this process and of the processes
+    it starts afterwards (e.g. the workers of SelfPlay.py) find it without passing it around.
+
+    Args:
+        model_path (str): Path of the model.
+        **kwargs: The other arguments of InferenceServer.
+
+    Returns:
+        tuple: The server process and the address to pass to RemoteNeuralNet; terminate the process
+            to stop the server.
+    """
+    if kwargs.get("authkey") is None:
+        kwargs["authkey"] = os.urandom(32)
+    os.environ[AUTHKEY_ENV] = kwargs["authkey"].hex()
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_serve, args=(sender, model_path, kwargs), daemon=True)
+    process.start()
+    address = receiver.recv()
+    receiver.close()
+    return process, address
+
+
+class RemoteNeuralNet:
+    def __init__(self, address, authkey=None, cache=None) -> None:
+        """
+        Client of an InferenceServer, a drop-in replacement of NeuralNetTFLite: the states are encoded
+        here and scored by the server, batched with the requests of the other processes.
+
+        Args:
+            address (str): Address of the server, see start_server.
+            authkey (bytes, optional): Key of the server. Defaults to None (read from the AUTHKEY_ENV
+                environment variable set by start_server).
+            cache (EvaluationCache, optional): Cache of the scores, kept in this process. Defaults to None.
+        """
+        self.address = address
+        self.cache = cache
+        # one request in flight per connection, engines shared between threads score one call at a time
+        self.lock = threading.RLock()
+        if authkey is None:
+            if AUTHKEY_ENV not in os.environ:
+                raise ValueError(f"No key for the InferenceServer at {address}: pass authkey or set {AUTHKEY_ENV} "
+                                 "(start_server sets it for the processes it starts)")
+            authkey = bytes.fromhex(os.environ[AUTHKEY_ENV])
+        self.connection = Client(address, authkey=authkey)
+        self.encoder = StateEncoder()
+        # rows of get_move_scores, grown to the most moves scored at once
+        self.buffer = self.encoder.new_buffer(batch_size=64)
+
+    def get_state_score(self, state):
+        return self.get_state_scores([state])[0]
+
+    def get_state_scores(self, states):
+        """
+        Score states with one round trip to the server. States whose score is in the cache are not
+        sent.
+
+        Args:
+            states (list): The states to score.
+
+        Returns:
+            np.ndarray: The score of each state, in order.
+        """
+        with self.lock:
+            if self.cache is not None:
+                return np.array(self.cache.score_states(states, self.get_state_scores_uncached), dtype=np.float32)
+            return self.get_state_scores_uncached(states)
+
+    def get_state_scores_uncached(self, states):
+        """ get_state_scores without the cache """
+        if not states:
+            return np.empty(0, dtype=np.float32)
+        with self.lock:
+            indexes = self.encoder.piece_indexes(states)
+            message = np.empty(len(indexes) + 1, dtype=np.int32)
+            message[0] = len(states)
+            message[1:] = indexes
+            self.connection.send_bytes(message.tobytes())
+            return np.frombuffer(self.connection.recv_bytes(), dtype=np.float32)
+
+    def get_move_scores(self, state, moves):
+        """
+        Score the states reached by moves from a state, like get_state_scores on copies of the state but
+        without the copies: the positions are encoded in place, see StateEncoder.score_moves.
+
+        Args:
+            state (State or BitboardState): The position, moved in place and restored.
+            moves (list): (i, j, new_i, new_j) moves of the player to move.
+
+        Returns:
+            np.ndarray: The score of each move, in order.
+        """
+        with self.lock:
+            if len(moves) > len(self.buffer):
+                self.buffer = self.encoder.new_buffer(batch_size=len(moves))
+            return self.encoder.score_moves(state, moves, self.buffer, self.score_encoded, self.cache)
+
+    def score_encoded(self, encoded):
+        """ score states encoded by a StateEncoder, sending the server the indexes of their pieces """
+        rows, planes = np.nonzero(encoded.reshape(-1, encoded.shape[-1])[:, 3:])
+        message = np.empty(len(rows) + 1, dtype=np.int32)
+        message[0] = len(encoded)
+        message[1:] = rows * encoded.shape[-1] + planes + 3
+        with self.lock:
+            self.connection.send_bytes(message.tobytes())
+            return np.frombuffer(self.connection.recv_bytes(), dtype=np.float32)
+
+    def server_stats(self):
+        """ return the counters of the server (see InferenceServer.stats) as a dict """
+        with self.lock:
+            self.connection.send_bytes(np.array([STATS_REQUEST], dtype=np.int32).tobytes())
+            requests, batches, states = np.frombuffer(self.connection.recv_bytes(), dtype=np.int64).tolist()
+        return {
+            "requests": requests,
+            "batches": batches,
+            "states": states,
+            "states_per_batch": states / batches if batches else 0.0,
+        }
+
+    def close(self):
+        self.connection.close()
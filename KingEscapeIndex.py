@@ -0,0 +1,157 @@
+from Utils import Entity
+from BitboardState import BitboardState, RAY_MASKS, ASCENDING_DIRECTIONS, CAMPS, CASTLE, ESCAPES, BOARD_SIZE, iterate_bits
+
+DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+# squares the king can slide through or stop on
+KING_SQUARES = (Entity.square, Entity.escape)
+
+
+class KingEscape:
+    def __init__(self, distance, first_steps, lanes) -> None:
+        """
+        How far the king is from escaping, with the pieces where they stand.
+
+        Args:
+            distance (int): Least number of king moves to an escape tile, max_distance + 1 of the index
+                when it is farther or walled in.
+            first_steps (set): Squares the king can move to that start one of the shortest routes, the
+                escape tiles themselves when distance is 1.
+            lanes (set): When distance is 1, the squares between the king and the escape tiles it can
+                reach, escape tiles included: black must land on them to stop the escape. Empty otherwise.
+        """
+        self.distance = distance
+        self.first_steps = first_steps
+        self.lanes = lanes
+
+
+class KingEscapeIndex:
+    def __init__(self, max_distance=2, max_entries=2**16) -> None:
+        """
+        Distance of the king to the escape tiles: the least number of king moves (slides along a row or
+        a column, through empty squares, never onto a camp or the castle) to an escape tile, with the
+        other pieces fixed. It is found with a breadth-first search from the king's square.
+
+        The index follows the moves of the search through the piece_hash of the state: each position
+        is searched once, and the next lookups of the position (transpositions, the tree's next move)
+        read the cached result. The king's square comes from where_is_king, which State keeps up to
+        date on every move.
+
+        A distance of 1 means white can escape with its next move. The tree uses it to skip white's
+        last ply when no escape is open (see Tree), MoveOrdering to put black's blocking moves and
+        white's approaching king moves first.
+
+        Args:
+            max_distance (int, optional): Deepest distance searched, farther kings get max_distance + 1.
+                Defaults to 2.
+            max_entries (int, optional): Positions cached, the cache is emptied when it is full. Defaults to 2**16.
+        """
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.entries = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, state):
+        """
+        Return the KingEscape of a state.
+
+        Args:
+            state (State or BitboardState): The position.
+        """
+        key = state.piece_hash
+        escape = self.entries.get(key)
+        if escape is not None:
+            self.hits += 1
+            return escape
+        self.misses += 1
+        if len(self.entries) >= self.max_entries:
+            self.entries.clear()
+        if isinstance(state, BitboardState):
+            escape = self.search_bitboard(state)
+        else:
+            escape = self.search_board(state)
+        self.entries[key] = escape
+        return escape
+
+    def distance(self, state):
+        """ least number of king moves to an escape tile, max_distance + 1 when farther """
+        return self.lookup(state).distance
+
+    def search_board(self, state):
+        board = state.board
+        king = state.where_is_king()
+        if king is None:
+            return KingEscape(self.max_distance + 1, set(), set())
+        # first step of a shortest route to each square reached so far
+        first_step = {king: None}
+        frontier = [king]
+        lanes = set()
+        for distance in range(1, self.max_distance + 1):
+            next_frontier, first_steps = [], set()
+            for i, j in frontier:
+                for di, dj in DIRECTIONS:
+                    lane = []
+                    new_i, new_j = i + di, j + dj
+                    while 0 <= new_i < BOARD_SIZE and 0 <= new_j < BOARD_SIZE and board[new_i][new_j] in KING_SQUARES:
+                        square = (new_i, new_j)
+                        lane.append(square)
+                        if board[new_i][new_j] == Entity.escape:
+                            first_steps.add(square if distance == 1 else first_step[(i, j)])
+                            if distance == 1:
+                                lanes.update(lane)
+                            break
+                        if square not in first_step:
+                            first_step[square] = square if distance == 1 else first_step[(i, j)]
+                            next_frontier.append(square)
+                        new_i, new_j = new_i + di, new_j + dj
+            if first_steps:
+                return KingEscape(distance, first_steps, lanes)
+            frontier = next_frontier
+        return KingEscape(self.max_distance + 1, set(), set())
+
+    def search_bitboard(self, state):
+        if not state.king:
+            return KingEscape(self.max_distance + 1, set(), set())
+        blockers = state.white | state.black | CAMPS | CASTLE
+        king = state.king.bit_length() - 1
+        first_step = {king: None}
+        frontier = [king]
+        lanes = 0
+        for distance in range(1, self.max_distance + 1):
+            next_frontier, first_steps = [], set()
+            for square in frontier:
+                for d in range(4):
+                    ray = RAY_MASKS[d][square]
+                    hit = ray & blockers
+                    if hit:
+                        nearest = (hit & -hit).bit_length() - 1 if d in ASCENDING_DIRECTIONS else hit.bit_length() - 1
+                        ray &= ~((1 << nearest) | RAY_MASKS[d][nearest])
+                    escapes = ray & ESCAPES
+                    if escapes:
+                        # the king stops on the first escape tile of the ray
+                        nearest = (escapes & -escapes).bit_length() - 1 if d in ASCENDING_DIRECTIONS else escapes.bit_length() - 1
+                        first_steps.add(nearest if distance == 1 else first_step[square])
+                        ray &= ~RAY_MASKS[d][nearest]
+                        if distance == 1:
+                            lanes |= ray
+                        continue
+                    for reached in iterate_bits(ray):
+                        if reached not in first_step:
+                            first_step[reached] = reached if distance == 1 else first_step[square]
+                            next_frontier.append(reached)
+            if first_steps:
+                return KingEscape(distance, {divmod(square, BOARD_SIZE) for square in first_steps},
+                                  {divmod(square, BOARD_SIZE) for square in iterate_bits(lanes)})
+            frontier = next_frontier
+        return KingEscape(self.max_distance + 1, set(), set())
+
+    def stats(self):
+        """ return the counters of the index as a dict """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
@@ -0,0 +1,94 @@
+from Utils import Entity
+
+
+class MoveOrdering:
+    def __init__(self, killers_per_depth=2) -> None:
+        """
+        Orders the moves of the tree's nodes, the ones most likely to win or to end a search early first.
+
+        Moves are sorted on three keys, most important first:
+            1. the static priority of the original ordering: moves of the king for white, moves
+               next to the king for black. With the king's escape routes (see KingEscapeIndex),
+               white's king moves that start a shortest route to an escape come first, and black's
+               moves blocking an open escape come before the other moves next to the king,
+            2. killer moves: the latest moves that triggered a cutoff at the same depth of the tree,
+            3. the history heuristic: how often, and how deep, a move has triggered cutoffs so far.
+        A cutoff is a child whose win stops the search of its siblings ("siblings birth control"),
+        or, in the pruned search, the reply after which an opponent's node is cut.
+
+        The sort is stable, so moves that tie on every key keep the order of the move generator.
+        The tables are meant to be kept by an Agent for the whole game, see new_search.
+
+        Args:
+            killers_per_depth (int, optional): Number of killer moves kept for each depth. Defaults to 2.
+        """
+        self.killers_per_depth = killers_per_depth
+        self.history = {Entity.white: {}, Entity.black: {}}
+        self.killers = {}
+        self.cutoffs = 0
+
+    def new_search(self):
+        """ start the search of a new move: forget the killers, which are tied to depths of the old tree, and age the history """
+        self.killers = {}
+        for table in self.history.values():
+            for move in list(table):
+                table[move] //= 2
+                if not table[move]:
+                    del table[move]
+
+    def order(self, moves, player, depth, king_position, escape=None):
+        """
+        Sort the moves of a node.
+
+        Args:
+            moves (list): (i, j, new_i, new_j) moves of the player.
+            player (Entity): The player to move.
+            depth (int): Depth of the node in the tree.
+            king_position (tuple): (i, j) of the king, or None.
+            escape (KingEscape, optional): Escape routes of the king in this position. Defaults to None.
+
+        Returns:
+            list: The moves, the most promising first.
+        """
+        history = self.history[player]
+        killers = self.killers.get(depth, ())
+        if king_position is None:
+            return sorted(moves, key=lambda move: (move not in killers, -history.get(move, 0)))
+        king_i, king_j = king_position
+        if player == Entity.white:
+            if escape is not None and escape.first_steps:
+                first_steps = escape.first_steps
+                def key(move):
+                    return ((move[0], move[1]) != king_position, (move[2], move[3]) not in first_steps,
+                            move not in killers, -history.get(move, 0))
+            else:
+                def key(move):
+                    return ((move[0], move[1]) != king_position, move not in killers, -history.get(move, 0))
+        elif escape is not None and escape.lanes:
+            lanes = escape.lanes
+            def key(move):
+                return ((move[2], move[3]) not in lanes, abs(move[2] - king_i) + abs(move[3] - king_j) != 1,
+                        move not in killers, -history.get(move, 0))
+        else:
+            def key(move):
+                return (abs(move[2] - king_i) + abs(move[3] - king_j) != 1, move not in killers, -history.get(move, 0))
+        return sorted(moves, key=key)
+
+    def record_cutoff(self, player, depth, move, remaining_depth):
+        """
+        Reward a move that triggered a cutoff.
+
+        Args:
+            player (Entity): The player who played the move.
+            depth (int): Depth of the node where the move was played.
+            move (tuple): The (i, j, new_i, new_j) move.
+            remaining_depth (int): Plies searched below the node, deeper cutoffs save more and weigh more.
+        """
+        self.cutoffs += 1
+        history = self.history[player]
+        history[move] = history.get(move, 0) + remaining_depth * remaining_depth
+        killers = self.killers.setdefault(depth, [])
+        if move in killers:
+            killers.remove(move)
+        killers.insert(0, move)
+        del killers[self.killers_per_depth:]
@@ -0,0 +1,170 @@
+from AI.ReadyDataset import StateEncoder
+import numpy as np
+import threading
+from Utils import Entity
+
+
+def relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+ACTIVATIONS = {"relu": relu, "tanh": np.tanh, "sigmoid": sigmoid, "linear": lambda x: x}
+
+
+class NeuralNetNumpy:
+    def __init__(self, model_path=r"model.npz", cache=None) -> None:
+        """
+        Runs a Dense (MLP) evaluator exported by AI/ExportNumpy.py with NumPy only, a drop-in
+        replacement of NeuralNetTFLite that doesn't need TensorFlow.
+
+        Args:
+            model_path (str, optional): Path of the .npz weights. Defaults to "model.npz".
+            cache (EvaluationCache, optional): Cache of the scores, can be shared with other engines.
+                Defaults to None (no cache).
+        """
+        self.cache = cache
+        # the cache is not thread-safe, engines shared between threads (see EngineRegistry) score one call at a time
+        self.lock = threading.Lock()
+        with np.load(model_path) as weights:
+            self.layers = [(weights[f"kernel_{k}"], weights[f"bias_{k}"], ACTIVATIONS[str(activation)])
+                           for k, activation in enumerate(weights["activations"])]
+        self.encoder = StateEncoder()
+        # grown to the largest batch scored so far
+        self.buffer = self.encoder.new_buffer(batch_size=64)
+
+    def get_state_score(self, state):
+        return self.get_state_scores([state])[0]
+
+    def get_state_scores(self, states):
+        """
+        Score many states with one matrix product per layer. States whose score is in the cache
+        are not scored again.
+
+        Args:
+            states (list): The states to score.
+
+        Returns:
+            np.ndarray: The score of each state, in order.
+        """
+        with self.lock:
+            if self.cache is not None:
+                return np.array(self.cache.score_states(states, self.get_state_scores_uncached), dtype=np.float32)
+            return self.get_state_scores_uncached(states)
+
+    def get_state_scores_uncached(self, states):
+        """ get_state_scores without the cache """
+        if len(states) > len(self.buffer):
+            self.buffer = self.encoder.new_buffer(batch_size=len(states))
+        return self.forward(self.encoder.encode_batch(states, self.buffer))
+
+    def get_move_scores(self, state, moves):
+        """
+        Score the states reached by moves from a state, like get_state_scores on copies of the state but
+        without the copies: the positions are encoded in place, see StateEncoder.score_moves.
+
+        Args:
+            state (State or BitboardState): The position, moved in place and restored.
+            moves (list): (i, j, new_i, new_j) moves of the player to move.
+
+        Returns:
+            np.ndarray: The score of each move, in order.
+        """
+        with self.lock:
+            if len(moves) > len(self.buffer):
+                self.buffer = self.encoder.new_buffer(batch_size=len(moves))
+            return self.encoder.score_moves(state, moves, self.buffer, self.forward, self.cache)
+
+    def score_encoded(self, encoded):
+        """
+        Score states already encoded by a StateEncoder, see InferenceServer.
+
+        Args:
+            encoded (np.ndarray): A [N, 9, 9, 6] float32 tensor.
+
+        Returns:
+            np.ndarray: The N scores.
+        """
+        with self.lock:
+            return self.forward(encoded)
+
+    def forward(self, encoded):
+        x = encoded.reshape(len(encoded), -1)
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x[:, 0]
+
+
+class NeuralNetAccumulator:
+    def __init__(self, model_path=r"model.npz") -> None:
+        """
+        Incremental (NNUE style) evaluation of a Dense evaluator exported by AI/ExportNumpy.py.
+
+        The pre-activations of the first layer are a sum of kernel rows, one for each input set to 1:
+        the terrain rows, which never change, and one row per piece. The accumulator keeps this sum for
+        the position of a state and follows the moves played on it: a move subtracts the row of the
+        piece on its old square, adds the one on its new square and subtracts the rows of the captured
+        pieces. Evaluating a position then only runs the small layers after the first one.
+
+        Play the moves with make_move / unmake_move of the accumulator instead of the state's, they
+        update both. The accumulators of the previous positions are kept on a stack, so taking a move
+        back restores the sum exactly.
+
+        Args:
+            model_path (str, optional): Path of the .npz weights. Defaults to "model.npz".
+        """
+        self.model_path = model_path
+        engine = NeuralNetNumpy(model_path=model_path)
+        first_kernel, first_bias, self.first_activation = engine.layers[0]
+        self.layers = engine.layers[1:]
+        board_size = engine.encoder.board_shape[0]
+        # rows of the first kernel by input plane, then by square: [6, 81, units]
+        rows = first_kernel.reshape(board_size * board_size, 6, -1).transpose(1, 0, 2)
+        terrain = engine.encoder.terrain.reshape(-1, 3).T
+        self.terrain_sum = first_bias + sum(terrain[c] @ rows[c] for c in range(3))
+        self.piece_rows = {Entity.white: rows[3], Entity.black: rows[4], Entity.king: rows[5]}
+        self.board_size = board_size
+
+        self.accumulator = None
+        self.stack = []
+
+    def reset(self, state):
+        """ compute the accumulator of a state from scratch """
+        self.accumulator = self.terrain_sum.copy()
+        for i, row in enumerate(state.board):
+            for j, cell in enumerate(row):
+                if cell in self.piece_rows:
+                    self.accumulator += self.piece_rows[cell][i * self.board_size + j]
+        self.stack = []
+
+    def make_move(self, state, move):
+        """
+        Play a move on the state and update the accumulator.
+
+        Returns:
+            MoveRecord: The record of state.make_move, to pass to unmake_move.
+        """
+        record = state.make_move(move)
+        i, j, new_i, new_j = move
+        rows = self.piece_rows[record.piece]
+        accumulator = self.accumulator + rows[new_i * self.board_size + new_j] - rows[i * self.board_size + j]
+        for captured_i, captured_j, piece in record.captured:
+            accumulator -= self.piece_rows[piece][captured_i * self.board_size + captured_j]
+        self.stack.append(self.accumulator)
+        self.accumulator = accumulator
+        return record
+
+    def unmake_move(self, state, record):
+        """ take back a move played with make_move, on the state and the accumulator """
+        state.unmake_move(record)
+        self.accumulator = self.stack.pop()
+
+    def evaluate(self):
+        """ score of the current position, the same as NeuralNetNumpy.get_state_score's """
+        x = self.first_activation(self.accumulator.copy())
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return float(x[0])
@@ -1,31 +1,127 @@
-from AI.ReadyDataset import state_to_nparray, initialize_nps
+from AI.ReadyDataset import StateEncoder
 import numpy as np
-import tensorflow as tf
+import threading
+try:
+    # the standalone runtime loads much faster than the whole of TensorFlow
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
 
 
 class NeuralNetTFLite:
-    def __init__(self, model_path=r"model.tflite") -> None:
-        self.interpreter = tf.lite.Interpreter(model_path=model_path)
+    def __init__(self, model_path=r"model.tflite", batch_size=64, cache=None, num_threads=None) -> None:
+        # EvaluationCache of the scores, can be shared with other engines (None for no cache)
+        self.cache = cache
+        # the interpreters and the cache are not thread-safe, engines shared between threads
+        # (see EngineRegistry) score one call at a time
+        self.lock = threading.RLock()
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
         self.interpreter.allocate_tensors()
 
         # Get input and output details
         self.input_details = self.interpreter.get_input_details()
         self.output_details = self.interpreter.get_output_details()
 
-        self.np_camps, self.np_castle, self.np_escapes = initialize_nps()
+        self.encoder = StateEncoder()
+        self.single_matrix = self.encoder.new_buffer(batch_size=1)
 
         # Warm up
         test_matrix = np.ones(self.input_details[0]['shape'], dtype=np.float32)
         self.interpreter.set_tensor(self.input_details[0]['index'], test_matrix)
         self.interpreter.invoke()
 
+        # A second interpreter scores batches of states. Its input is resized once to a fixed
+        # batch size, so scoring never reallocates the tensors; smaller batches are padded.
+        self.batch_size = batch_size
+        self.batch_interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        batch_input = self.batch_interpreter.get_input_details()[0]
+        self.batch_interpreter.resize_tensor_input(batch_input['index'], [batch_size, *batch_input['shape'][1:]])
+        self.batch_interpreter.allocate_tensors()
+        self.batch_input_index = self.batch_interpreter.get_input_details()[0]['index']
+        self.batch_output_index = self.batch_interpreter.get_output_details()[0]['index']
+        self.batch_matrix = self.encoder.new_buffer(batch_size=batch_size)
+        # rows of get_move_scores, grown to the most moves scored at once
+        self.moves_matrix = self.encoder.new_buffer(batch_size=batch_size)
+        self.batch_interpreter.set_tensor(self.batch_input_index, self.batch_matrix)
+        self.batch_interpreter.invoke()
+
     def get_state_score(self, state):
-        np_mat = state_to_nparray(self.np_camps, self.np_castle, self.np_escapes, state=state)
-        np_mat = np.expand_dims(np_mat, axis=0)
-        np_mat = np.transpose(np_mat, (0, 2, 3, 1))
+        with self.lock:
+            if self.cache is not None:
+                score = self.cache.lookup(state.piece_hash)
+                if score is not None:
+                    return score
+            self.encoder.encode(state, self.single_matrix)
+            self.interpreter.set_tensor(self.input_details[0]['index'], self.single_matrix)
+            self.interpreter.invoke()
 
-        self.interpreter.set_tensor(self.input_details[0]['index'], np_mat.astype(np.float32))
-        self.interpreter.invoke()
+            output_data = self.interpreter.get_tensor(self.output_details[0]['index'])
+            if self.cache is not None:
+                self.cache.store(state.piece_hash, output_data[0][0])
+            return output_data[0][0]
+
+    def get_state_scores(self, states):
+        """
+        Score many states with one invoke per batch_size states, instead of one invoke per state.
+        States whose score is in the cache are not scored again.
+
+        Args:
+            states (list): The states to score.
+
+        Returns:
+            np.ndarray: The score of each state, in order.
+        """
+        with self.lock:
+            if self.cache is not None:
+                return np.array(self.cache.score_states(states, self.get_state_scores_uncached), dtype=np.float32)
+            return self.get_state_scores_uncached(states)
+
+    def get_move_scores(self, state, moves):
+        """
+        Score the states reached by moves from a state, like get_state_scores on copies of the state but
+        without the copies: the positions are encoded in place, see StateEncoder.score_moves.
+
+        Args:
+            state (State or BitboardState): The position, moved in place and restored.
+            moves (list): (i, j, new_i, new_j) moves of the player to move.
+
+        Returns:
+            np.ndarray: The score of each move, in order.
+        """
+        with self.lock:
+            if len(moves) > len(self.moves_matrix):
+                self.moves_matrix = self.encoder.new_buffer(batch_size=len(moves))
+            return self.encoder.score_moves(state, moves, self.moves_matrix, self.score_encoded, self.cache)
+
+    def get_state_scores_uncached(self, states):
+        """ get_state_scores without the cache """
+        scores = np.empty(len(states), dtype=np.float32)
+        for start in range(0, len(states), self.batch_size):
+            chunk = self.encoder.encode_batch(states[start:start + self.batch_size], self.batch_matrix)
+            scores[start:start + len(chunk)] = self.invoke_batch(len(chunk))
+        return scores
+
+    def score_encoded(self, encoded):
+        """
+        Score states already encoded by a StateEncoder, see InferenceServer.
+
+        Args:
+            encoded (np.ndarray): A [N, 9, 9, 6] float32 tensor.
+
+        Returns:
+            np.ndarray: The N scores.
+        """
+        with self.lock:
+            scores = np.empty(len(encoded), dtype=np.float32)
+            for start in range(0, len(encoded), self.batch_size):
+                chunk = encoded[start:start + self.batch_size]
+                self.batch_matrix[:len(chunk)] = chunk
+                scores[start:start + len(chunk)] = self.invoke_batch(len(chunk))
+            return scores
 
-        output_data = self.interpreter.get_tensor(self.output_details[0]['index'])
-        return output_data[0][0]
\ No newline at end of file
+    def invoke_batch(self, count):
+        """ score the first count states of batch_matrix """
+        self.batch_interpreter.set_tensor(self.batch_input_index, self.batch_matrix)
+        self.batch_interpreter.invoke()
+        return self.batch_interpreter.get_tensor(self.batch_output_index)[:count, 0]
@@ -1,7 +1,16 @@
 from Utils import Entity, State
+from BitboardState import BitboardState
+from TranspositionTable import TranspositionTable
+from MoveOrdering import MoveOrdering
+from KingEscapeIndex import KingEscapeIndex
+from EngineRegistry import get_engine
+from Rules import opponent, game_winner
+from ProofNumberSearch import ProofNumberSearch
 import random
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
 from time import time
+import math
 import os 
 import json
 
@@ -9,13 +18,19 @@ import json
 def mean(lst):
     return sum(lst) / len(lst)
 
+
+class SearchTimeout(Exception):
+    """ raised inside Tree.search_tree when the deadline of the search has passed """
+
 class Node:     
     def __init__(self, state:State, player=Entity.white, depth=0, last_move_index=None):
         """
         Initializes a node in the game tree.
 
         Args:
-            state (State): The game state associated with the node.
+            state (State): The game state associated with the node. Nodes of a tree share one state,
+                which Tree.search_tree moves in place with make_move / unmake_move, so it only holds
+                this node's position while the search is visiting it.
             player (Entity, optional): The player to make the move at this node. Defaults to Entity.white.
             depth (int, optional): The depth of the node in the game tree. Defaults to 0.
             last_move_index (tuple, optional): Index of the last move made. Defaults to None.
@@ -25,6 +40,8 @@ class Node:
         self.depth = depth 
         self.score = 0
         self.children = []
+        # whether the children were generated with the move restrictions of the tree's last ply
+        self.children_restricted = False
         self.node_id = ''
         self.last_move_index = last_move_index
 
@@ -34,66 +51,106 @@ class Node:
         """
         self.node_id = self.get_node_id()
 
-    def generate_children(self):
+    def generate_children(self, maximum_depth=None, move_ordering=None, king_escape_index=None):
         """
         Generates child nodes for the current node based on possible moves in the game.
 
         It prioritizes moves and constraints based on the current state and player's turn.
+        Children kept from an earlier search (see Agent.reuse_previous_tree) are reused when
+        they were generated with the same move restrictions.
+
+        Args:
+            maximum_depth (int, optional): Maximum depth of the tree, the moves of its last ply are restricted.
+                Defaults to MaximumDepth.
+            move_ordering (MoveOrdering, optional): Ordering of the moves, see child_moves. Defaults to None.
+            king_escape_index (KingEscapeIndex, optional): Escape routes of the king, see child_moves. Defaults to None.
+        """
+        if maximum_depth is None:
+            maximum_depth = MaximumDepth
+        restricted = self.depth == maximum_depth-1
+        if self.children and self.children_restricted == restricted:
+            for child in self.children:
+                child.score = 0
+            return
+        self.children = [self.make_child(move)
+                         for move in self.child_moves(maximum_depth, move_ordering, king_escape_index)]
+        self.children_restricted = restricted
+
+    def iter_children(self, maximum_depth=None, move_ordering=None, king_escape_index=None):
+        """
+        Streaming counterpart of generate_children: yield the child nodes one at a time, in the
+        same order, without keeping them in self.children.
+
+        Args:
+            maximum_depth (int, optional): Maximum depth of the tree. Defaults to MaximumDepth.
+            move_ordering (MoveOrdering, optional): Ordering of the moves, see child_moves. Defaults to None.
+            king_escape_index (KingEscapeIndex, optional): Escape routes of the king, see child_moves. Defaults to None.
+
+        Returns:
+            tuple: (generator of the children, number of children)
+        """
+        moves = self.child_moves(maximum_depth, move_ordering, king_escape_index)
+        return (self.make_child(move) for move in moves), len(moves)
+
+    def make_child(self, move):
+        """
+        Create the child reached by a move, it shares the state and the search plays its move in place.
+
+        Args:
+            move (tuple): (i, j, new_i, new_j) move of the player of this node.
+        """
+        return Node(state=self.state,
+                    player=opponent(self.who_has_to_play),
+                    depth=self.depth+1,
+                    last_move_index=move)
+
+    def child_moves(self, maximum_depth=None, move_ordering=None, king_escape_index=None):
         """
-        from TablutGame import TablutGame
-        if self.depth == MaximumDepth-1 and self.who_has_to_play == Entity.white:
-            king_pos = self.state.where_is_king()
+        The moves of the player of this node, the most promising first.
+
+        Args:
+            maximum_depth (int, optional): Maximum depth of the tree, the moves of its last ply are restricted.
+                Defaults to MaximumDepth.
+            move_ordering (MoveOrdering, optional): History and killer tables of the search. Defaults to None
+                (static ordering only).
+            king_escape_index (KingEscapeIndex, optional): Escape routes of the king, which refine the static
+                ordering (see MoveOrdering.order). Defaults to None.
+
+        Returns:
+            list: (i, j, new_i, new_j) moves.
+        """
+        if maximum_depth is None:
+            maximum_depth = MaximumDepth
+        king_pos = self.state.where_is_king()
+        if self.depth == maximum_depth-1 and self.who_has_to_play == Entity.white:
             possible_moves = self.state.possible_moves_for_index(*king_pos)
         else:
             possible_moves = self.state.possible_moves(for_player=self.who_has_to_play)
         
-        # Prioritze the moves that have more probablity to win
-        if self.who_has_to_play == Entity.white:
-            new_possible_moves_list = []
-            for ndx,(i,j,new_i,new_j) in enumerate(possible_moves):
-                if (i,j) == self.state.where_is_king():
-                    new_possible_moves_list.append((i,j,new_i,new_j))
-            for pm in possible_moves:
-                if pm not in new_possible_moves_list:
-                    new_possible_moves_list.append(pm)
-            possible_moves = new_possible_moves_list
-        
-        if self.who_has_to_play == Entity.black:
-            new_possible_moves_list = []
-            for ndx, (i,j,new_i,new_j) in enumerate(possible_moves):
-                index_neighbors_of_dest = [(new_i,new_j+1), (new_i,new_j-1), (new_i+1,new_j), (new_i-1,new_j)]
-                for x,y in index_neighbors_of_dest:
-                    try:
-                        if Entity.king == self.state.board[x][y]:
-                            new_possible_moves_list.append(possible_moves[ndx])
-                            del possible_moves[ndx]
-                    except IndexError:
-                        pass
-            new_possible_moves_list.extend(possible_moves)
-            possible_moves = new_possible_moves_list
-        
-        # The last move of black must be close to the king
-        if self.depth == MaximumDepth-1 and self.who_has_to_play == Entity.black:
+        # The last move of black must be close to the king, filtered before the moves are sorted
+        last_ply_of_black = self.depth == maximum_depth-1 and self.who_has_to_play == Entity.black
+        if last_ply_of_black:
+            board = self.state.board
             last_moves_black = []
             for i, (_,_,dest_i,dest_j) in enumerate(possible_moves):
                 index_neighbors_of_dest = [(dest_i,dest_j+1), (dest_i,dest_j-1), (dest_i+1,dest_j), (dest_i-1,dest_j)]
                 for x,y in index_neighbors_of_dest:
                     try:
-                        if Entity.king == self.state.board[x][y]:
+                        if Entity.king == board[x][y]:
                             last_moves_black.append(possible_moves[i])
                     except IndexError:
                         pass
             possible_moves = last_moves_black
 
-        for move_tuple in possible_moves:
-            i, j, new_i, new_j = move_tuple
-            #create new child 
-            child_state = TablutGame.make_new_state(self.state, self.who_has_to_play, move_tuple)
-            child_node = Node(state=child_state,
-                            player=TablutGame.who_is_opponent_of(self.who_has_to_play), 
-                            depth=self.depth+1,
-                            last_move_index=(i, j, new_i, new_j))
-            self.children.append(child_node)
+        # Prioritze the moves that have more probablity to win
+        if move_ordering is None:
+            move_ordering = MoveOrdering()
+        # black's last moves can't block an escape any more, white's next move is past the tree
+        escape = None
+        if king_escape_index is not None and king_pos is not None and not last_ply_of_black:
+            escape = king_escape_index.lookup(self.state)
+        possible_moves = move_ordering.order(possible_moves, self.who_has_to_play, self.depth, king_pos, escape)
+        return possible_moves
 
     def get_node_id(self):
         """
@@ -107,7 +164,9 @@ class Node:
 
 
 class Tree:
-    def __init__(self, root_node:Node, maximum_depth=3, for_player=Entity.white) -> None:
+    def __init__(self, root_node:Node, maximum_depth=3, for_player=Entity.white, transposition_table=None,
+                 deadline=None, streaming=False, move_ordering=None, leaf_evaluator=None, leaf_weight=0.1,
+                 king_escape_index=None) -> None:
         """
         Initializes a tree with a root node and parameters for tree search.
 
@@ -115,16 +174,48 @@ class Tree:
             root_node (Node): The root node of the tree.
             maximum_depth (int, optional): The maximum depth to search in the tree. Defaults to 3.
             for_player (Entity, optional): The player for whom the search is performed. Defaults to Entity.white.
+            transposition_table (TranspositionTable, optional): Table of already searched positions,
+                can be shared by the trees of consecutive moves. Defaults to None (no table).
+            deadline (float, optional): time() after which search_tree raises SearchTimeout. Defaults to None.
+            streaming (bool, optional): Expand the nodes lazily: children are created one at a time
+                and dropped once searched, only the principal line (the best child of our nodes,
+                the worst of the opponent's) is kept. This bounds the memory of a search to about
+                depth x branching nodes, but the tree can't be reused or drawn. Defaults to False.
+            move_ordering (MoveOrdering, optional): History and killer tables ordering the moves, can be
+                shared by the trees of consecutive moves. Defaults to None (new tables for this tree).
+            leaf_evaluator (NeuralNetAccumulator, optional): Scores the leaves of the tree with the neural net,
+                following the moves of the search incrementally. Defaults to None (leaves score 0).
+            leaf_weight (float, optional): The neural net score of a leaf, in [-1, 1] and positive when it favours
+                white, is scaled by this weight. It must stay below win_reward, so that a sure win still
+                outweighs any evaluation and the bounds of search_tree_pruned hold. Defaults to 0.1.
+            king_escape_index (KingEscapeIndex, optional): Escape routes of the king, used to order the moves and
+                to skip white's last ply when it can't escape (see skip_last_ply). Can be shared by the trees of
+                consecutive moves. Defaults to None (a new index for this tree).
         """
         self.root = root_node
         self.maximum_depth = maximum_depth
         self.nodes_visited = 0
         self.for_player = for_player
         self.dont_visit_siblings = False
+        self.transposition_table = transposition_table
+        self.transposition_hits = 0
+        self.transposition_misses = 0
+        self.deadline = deadline
+        self.streaming = streaming
+        self.move_ordering = move_ordering if move_ordering is not None else MoveOrdering()
+        self.king_escape_index = king_escape_index if king_escape_index is not None else KingEscapeIndex()
+        self.last_plies_skipped = 0
         
         self.win_reward = 1
         self.lose_penalty = -100
 
+        self.leaf_evaluator = leaf_evaluator
+        self.leaf_weight = leaf_weight
+        if leaf_evaluator is not None:
+            if abs(leaf_weight) >= self.win_reward:
+                raise ValueError("leaf_weight must be smaller than win_reward")
+            leaf_evaluator.reset(root_node.state)
+
 
     def search_tree(self, node=Node):
         """
@@ -135,60 +226,391 @@ class Tree:
 
         Returns:
             bool: True if the current player wins; False otherwise.
+
+        Raises:
+            SearchTimeout: If the deadline of the tree has passed. The moves played on the state
+                are taken back on the way out, but the scores of the tree are incomplete.
+        """
+        game_result = self.visit_node(node)
+        if game_result is not None:
+            return game_result
+
+        if node.depth < self.maximum_depth and not self.skip_last_ply(node):
+            key = self.lookup_transposition(node)
+            if key is True:
+                return
+
+            children, number_of_children = self.expand(node)
+            if not number_of_children:
+                game_result = self.score_blocked(node)
+            if node.who_has_to_play == self.for_player:
+                _, best_child = self.search_children(node, children)
+                principal = best_child
+                if best_child is not None:
+                    node.score = best_child.score
+            else:
+                total = 0
+                principal = None
+                for child in children:
+                    move_record = self.make_move(node, child.last_move_index)
+                    try:
+                        self.search_tree(child)
+                    finally:
+                        self.unmake_move(node, move_record)
+                    total += child.score
+                    if principal is None or child.score < principal.score:
+                        principal = child
+                if number_of_children:
+                    node.score = total / number_of_children
+            self.keep_principal_line(node, principal)
+
+            if key is not None:
+                self.transposition_table.store(key, node.score, self.maximum_depth - node.depth)
+        else:
+            self.evaluate_leaf(node)
+
+        node.update_node_id()
+        return game_result
+
+
+    def search_tree_pruned(self, node=Node):
+        """
+        Mean-Max search with Star1 pruning of the opponent's (averaging) nodes.
+
+        Scores are bounded: below the root's children no node scores above win_reward.
+        So after some children of an averaging node are searched, the mean of all its children
+        is at most (sum so far + win_reward * children left) / children. Once that bound falls
+        below the best sibling already found by the maximizing parent, the node cannot be
+        chosen and its remaining children are skipped. The bound is passed down as a window
+        (alpha), so deeper averaging nodes prune against it too.
+
+        The root move and root score are the same as search_tree's: the best root child is
+        always searched exactly, pruned nodes only keep an upper bound of their score, lower
+        than the best sibling's.
+
+        Args:
+            node (Node): The node being explored. Defaults to root node.
+
+        Returns:
+            bool: True if the current player wins; False otherwise.
+        """
+        return self._search_pruned(node, -math.inf)[0]
+
+
+    def _search_pruned(self, node, alpha):
+        """
+        Star1 search of a node with a lower window bound alpha.
+
+        Returns:
+            tuple: (game_result, exact). When exact is False the node was cut and node.score
+                is an upper bound of its Mean-Max score, lower than alpha.
+        """
+        game_result = self.visit_node(node)
+        if game_result is not None:
+            return game_result, True
+        if node.depth >= self.maximum_depth or self.skip_last_ply(node):
+            self.evaluate_leaf(node)
+            node.update_node_id()
+            return None, True
+
+        key = self.lookup_transposition(node)
+        if key is True:
+            return None, True
+
+        children, number_of_children = self.expand(node)
+        exact = True
+        principal = None
+        if not number_of_children:
+            game_result = self.score_blocked(node)
+        if node.who_has_to_play == self.for_player and number_of_children:
+            any_cut, principal = self.search_children(node, children, use_pruning=True, alpha=alpha)
+            node.score = principal.score
+            # cut children are below their window, so they cannot hide a better score unless
+            # the whole node is below alpha
+            exact = not any_cut or node.score >= alpha
+        elif number_of_children:
+            upper_bound = self.win_reward
+            total = 0
+            for k, child in enumerate(children):
+                children_left = number_of_children - k - 1
+                # the child must score above this for the mean to reach alpha
+                child_alpha = alpha * number_of_children - total - children_left * upper_bound
+                move_record = self.make_move(node, child.last_move_index)
+                try:
+                    self._search_pruned(child, child_alpha)
+                finally:
+                    self.unmake_move(node, move_record)
+                total += child.score
+                if principal is None or child.score < principal.score:
+                    principal = child
+                best_possible_mean = (total + children_left * upper_bound) / number_of_children
+                if best_possible_mean < alpha:
+                    # the reply that lowered the mean the most is the one to try first next time
+                    self.move_ordering.record_cutoff(node.who_has_to_play, node.depth, principal.last_move_index,
+                                                     self.maximum_depth - node.depth)
+                    node.score = best_possible_mean
+                    exact = False
+                    break
+            else:
+                node.score = total / number_of_children
+        self.keep_principal_line(node, principal)
+
+        if key is not None and exact:
+            self.transposition_table.store(key, node.score, self.maximum_depth - node.depth)
+        node.update_node_id()
+        return game_result, exact
+
+
+    def search_children(self, node:Node, children, use_pruning=False, alpha=-math.inf):
+        """
+        Search the given children of a node where the tree's player is to move, setting their scores.
+
+        Args:
+            node (Node): The parent node, its state must hold its position.
+            children (iterable): The children to search, in order. Searching stops after a winning child.
+            use_pruning (bool, optional): Search the children with Star1 pruning. Defaults to False.
+            alpha (float, optional): Lower window bound of the parent when pruning. Defaults to -inf.
+
+        Returns:
+            tuple: (any_cut, best_child), any_cut is True if any child was cut by the pruning and
+                only has an upper bound as score, best_child is the first child with the highest
+                score (None if there are no children).
+        """
+        best = -math.inf
+        best_child = None
+        any_cut = False
+        for child in children:
+            move_record = self.make_move(node, child.last_move_index)
+            try:
+                if use_pruning:
+                    node_is_successful, child_exact = self._search_pruned(child, max(alpha, best))
+                    any_cut = any_cut or not child_exact
+                else:
+                    node_is_successful = self.search_tree(child)
+            finally:
+                self.unmake_move(node, move_record)
+            if child.score > best:
+                best = child.score
+                best_child = child
+            if node_is_successful==True and node.depth % 2 == 0:
+                self.move_ordering.record_cutoff(node.who_has_to_play, node.depth, child.last_move_index,
+                                                 self.maximum_depth - node.depth)
+                break
+        return any_cut, best_child
+
+
+    def score_blocked(self, node:Node):
+        """
+        Score an expanded node without children: its player has no move left and loses (see
+        Rules.game_winner). Not on the last ply, whose moves are restricted (see Node.child_moves), so
+        a node there may have no children while its player can still move; it scores 0.
+
+        Returns:
+            bool: True/False if the tree's player won/lost, None on the last ply.
+        """
+        if node.depth == self.maximum_depth - 1:
+            return None
+        winner = opponent(node.who_has_to_play)
+        node.score = self.win_reward if winner == self.for_player else self.lose_penalty
+        # like the wins of visit_node, a win right after the root's move comes first
+        if node.depth == 1:
+            node.score *= 5
+        return winner == self.for_player
+
+
+    def make_move(self, node:Node, move):
+        """ play a move of a node on the shared state, and on the leaf evaluator if there is one """
+        if self.leaf_evaluator is not None:
+            return self.leaf_evaluator.make_move(node.state, move)
+        return node.state.make_move(move)
+
+
+    def unmake_move(self, node:Node, move_record):
+        """ take back a move played with make_move """
+        if self.leaf_evaluator is not None:
+            self.leaf_evaluator.unmake_move(node.state, move_record)
+        else:
+            node.state.unmake_move(move_record)
+
+
+    def evaluate_leaf(self, node:Node):
+        """ score a leaf that doesn't end the game with the neural net, if the tree has a leaf evaluator """
+        if self.leaf_evaluator is not None:
+            score = self.leaf_evaluator.evaluate()
+            node.score = self.leaf_weight * (score if self.for_player == Entity.white else -score)
+
+
+    def skip_last_ply(self, node:Node):
+        """
+        Whether a node of white's last ply can be scored without expanding it.
+
+        On the last ply white only moves the king, and a king move that doesn't escape leads to a
+        leaf scoring 0. So when the king has no escape one move away, every child scores 0 and so
+        does the node, whoever the tree is searching for: it is left as a leaf. Not with a leaf
+        evaluator, whose leaves don't score 0, nor at the root, get_best_node needs its children.
+
+        Args:
+            node (Node): The node, its state must hold the node's position.
+        """
+        if (node.depth != self.maximum_depth - 1 or node.depth == 0 or node.who_has_to_play != Entity.white
+                or self.leaf_evaluator is not None):
+            return False
+        if self.king_escape_index.lookup(node.state).distance == 1:
+            return False
+        self.last_plies_skipped += 1
+        return True
+
+
+    def expand(self, node:Node):
+        """
+        Children of a node to search: a generator in streaming mode, otherwise node.children.
+
+        Returns:
+            tuple: (iterable of the children, number of children)
+        """
+        if self.streaming:
+            return node.iter_children(self.maximum_depth, self.move_ordering, self.king_escape_index)
+        node.generate_children(self.maximum_depth, self.move_ordering, self.king_escape_index)
+        return node.children, len(node.children)
+
+
+    def keep_principal_line(self, node:Node, principal):
+        """ in streaming mode, keep only the principal child of a searched node """
+        if self.streaming:
+            node.children = [principal] if principal is not None else []
+
+
+    def search_root_parallel(self, executor, number_of_tasks, use_pruning=True, transposition_table_entries=2**18):
+        """
+        Search the tree by splitting the children of the root between the processes of a pool.
+
+        The root's children are dealt round-robin into `number_of_tasks` groups, so every group gets
+        some of the promising moves that generate_children puts first. Each task searches its group
+        in a worker process (see search_root_moves) and sends back the scores, which are merged
+        here into the Mean-Max score of the root. Pruned children only get an upper bound that is
+        strictly below the best score of their group, so the root move is the same as a
+        sequential search's.
+
+        Args:
+            executor (concurrent.futures.ProcessPoolExecutor): The pool, kept warm between moves.
+            number_of_tasks (int): Number of groups the root's children are split into.
+            use_pruning (bool, optional): Search the groups with Star1 pruning. Defaults to True.
+            transposition_table_entries (int, optional): Size of the table each worker process keeps. Defaults to 2**18.
+
+        Raises:
+            SearchTimeout: If a worker runs past the deadline of the tree.
+        """
+        root = self.root
+        self.visit_node(root)
+        root.generate_children(self.maximum_depth, self.move_ordering, self.king_escape_index)
+        # the workers load their own copy of the leaf evaluator
+        leaf_model_path = self.leaf_evaluator.model_path if self.leaf_evaluator is not None else None
+
+        tasks = []
+        for k in range(min(number_of_tasks, len(root.children))):
+            children = root.children[k::number_of_tasks]
+            future = executor.submit(search_root_moves, root.state, root.who_has_to_play,
+                                     [child.last_move_index for child in children], self.maximum_depth,
+                                     self.for_player, use_pruning, self.deadline, transposition_table_entries,
+                                     self.streaming, leaf_model_path, self.leaf_weight)
+            tasks.append((future, children))
+        try:
+            for future, children in tasks:
+                scores, nodes_visited, hits, misses = future.result()
+                for child, score in zip(children, scores):
+                    child.score = score
+                    child.update_node_id()
+                self.nodes_visited += nodes_visited
+                self.transposition_hits += hits
+                self.transposition_misses += misses
+        except SearchTimeout:
+            for future, _ in tasks:
+                future.cancel()
+            raise
+
+        if root.children:
+            root.score = max(child.score for child in root.children)
+        root.update_node_id()
+
+
+    def visit_node(self, node:Node):
+        """
+        Count the visit of a node and score it if the move that led to it ended the game.
+
+        Args:
+            node (Node): The node being explored, its state must hold the node's position.
+
+        Returns:
+            bool: True/False if the game is over and the tree's player won/lost, None if the game goes on.
+
+        Raises:
+            SearchTimeout: If the deadline of the tree has passed.
         """
         self.nodes_visited += 1
-        black_wins = False
-        white_wins = False
+        if self.deadline is not None and time() > self.deadline:
+            raise SearchTimeout()
+        # a node kept from an earlier search may still hold that search's score
+        node.score = 0
+        winner = None
 
         if node.last_move_index:
             _, _, new_i, new_j = node.last_move_index
-            black_wins = node.state.if_black_captured_king(new_i, new_j)
-            white_wins = node.state.if_king_escaped(new_i, new_j)
-            if self.for_player == Entity.white:
-                if white_wins: 
-                    node.score = self.win_reward
-                elif black_wins: 
-                    node.score = self.lose_penalty
-            elif self.for_player == Entity.black:
-                if white_wins: 
-                    node.score = self.lose_penalty
-                elif black_wins: 
-                    node.score = self.win_reward
+            # a player left without a move is found when its node is expanded, see score_blocked
+            winner = game_winner(node.state, opponent(node.who_has_to_play), new_i, new_j, check_blocked=False)
+            if winner is not None:
+                node.score = self.win_reward if winner == self.for_player else self.lose_penalty
 
         # If the next best move wins the game, increase its score
         #  so the tree selects the move that is closest to winning the game
         if node.depth == 1 and not node.children:
             node.score *= 5
 
-        if black_wins:
-            if self.for_player == Entity.white:
-                return False 
-            elif self.for_player == Entity.black:
-                return True
-        elif white_wins:
-            if self.for_player == Entity.black:
-                return False 
-            elif self.for_player == Entity.white:
-                return True 
+        if winner is None:
+            return None
+        return winner == self.for_player
 
-        if node.depth < self.maximum_depth:
-            node.generate_children()
 
-            for child in node.children:
-                node_is_successful = self.search_tree(child)
-                if node_is_successful==True and node.depth % 2 == 0: 
-                    break
+    def lookup_transposition(self, node:Node):
+        """
+        Look a node up in the transposition table before expanding it.
 
-            children_score = [n.score for n in node.children]
-            if children_score:
-                if (node.who_has_to_play == Entity.black and self.for_player == Entity.white)\
-                or (node.who_has_to_play == Entity.white and self.for_player == Entity.black):
-                    node.score = mean(children_score)
-                elif (node.who_has_to_play == Entity.black and self.for_player == Entity.black)\
-                or (node.who_has_to_play == Entity.white and self.for_player == Entity.white):
-                    node.score = max(children_score)
+        Args:
+            node (Node): The node about to be expanded.
 
-        node.update_node_id()
+        Returns:
+            True if the table had the node (its score is set), None if there is no table or the
+            node is the root (which is always expanded, get_best_node needs its children),
+            otherwise the key under which to store the node once it is searched.
+        """
+        if self.transposition_table is None or node.depth == 0:
+            return None
+        key = self.transposition_key(node)
+        stored_score = self.transposition_table.lookup(key)
+        if stored_score is not None:
+            self.transposition_hits += 1
+            node.score = stored_score
+            node.update_node_id()
+            return True
+        self.transposition_misses += 1
+        return key
+
+
+    def transposition_key(self, node:Node):
+        """
+        Key of a node in the transposition table.
+
+        Besides the position, the Mean-Max score of an expanded node depends on how many plies
+        are left below it (the move restrictions of the last plies are tied to it), on who has
+        to play and on the player the tree is searching for. Keying on the remaining depth
+        instead of the depth lets the positions of one search be reused by the next ones.
+
+        Args:
+            node (Node): The node, its state must hold the node's position.
+
+        Returns:
+            tuple: (zobrist_hash, remaining_depth, who_has_to_play, for_player)
+        """
+        return (node.state.zobrist_hash, self.maximum_depth - node.depth, node.who_has_to_play, self.for_player)
 
 
     def get_best_node(self):
@@ -196,8 +618,11 @@ class Tree:
         Gets the best node based on calculated scores in the tree.
 
         Returns:
-            tuple: Index of the best move found in the tree.
+            tuple: Index of the best move found in the tree, None if the root has no children (the moves of
+                a one ply tree are restricted to the king's).
         """
+        if not self.root.children:
+            return None
         best_node = max(self.root.children, key=lambda x: x.score)
         return best_node.last_move_index
 
@@ -258,22 +683,199 @@ class Tree:
         net.write_html(file_name)
 
 
+# Transposition table, move ordering, king escape index and leaf evaluators of a worker process of the
+# parallel search, they live as long as the process
+_worker_transposition_table = None
+_worker_move_ordering = None
+_worker_king_escape_index = None
+_worker_leaf_evaluators = {}
+
+def search_root_moves(state, player, moves, maximum_depth, for_player, use_pruning, deadline,
+                      transposition_table_entries, streaming=False, leaf_model_path=None, leaf_weight=0.1):
+    """
+    Worker side of Tree.search_root_parallel: search some of the root's children.
+
+    Args:
+        state (State): The root state.
+        player (Entity): The player to move at the root.
+        moves (list): The moves leading to the children to search, in order.
+        maximum_depth (int): Depth of the tree.
+        for_player (Entity): The player the tree is searching for.
+        use_pruning (bool): Search with Star1 pruning.
+        deadline (float): time() after which the search raises SearchTimeout, or None.
+        transposition_table_entries (int): Size of the worker's transposition table, None for no table.
+        streaming (bool, optional): Expand the subtrees lazily, see Tree. Defaults to False.
+        leaf_model_path (str, optional): Weights of the leaf evaluator, see Tree. Defaults to None (no evaluator).
+        leaf_weight (float, optional): Weight of the leaf evaluations. Defaults to 0.1.
+
+    Returns:
+        tuple: (scores of the children, nodes visited, transposition hits, transposition misses)
+    """
+    global _worker_transposition_table, _worker_move_ordering, _worker_king_escape_index
+    if transposition_table_entries and _worker_transposition_table is None:
+        _worker_transposition_table = TranspositionTable(max_entries=transposition_table_entries)
+    table = _worker_transposition_table if transposition_table_entries else None
+    if table is not None:
+        table.new_search()
+    if _worker_move_ordering is None:
+        _worker_move_ordering = MoveOrdering()
+    _worker_move_ordering.new_search()
+    if _worker_king_escape_index is None:
+        _worker_king_escape_index = KingEscapeIndex()
+    leaf_evaluator = None
+    if leaf_model_path is not None:
+        if leaf_model_path not in _worker_leaf_evaluators:
+            from NueralNetNumpy import NeuralNetAccumulator
+            _worker_leaf_evaluators[leaf_model_path] = NeuralNetAccumulator(model_path=leaf_model_path)
+        leaf_evaluator = _worker_leaf_evaluators[leaf_model_path]
+
+    tree = Tree(Node(state=state, player=player), maximum_depth=maximum_depth, for_player=for_player,
+                transposition_table=table, deadline=deadline, streaming=streaming,
+                move_ordering=_worker_move_ordering, leaf_evaluator=leaf_evaluator, leaf_weight=leaf_weight,
+                king_escape_index=_worker_king_escape_index)
+    children = [Node(state=state, player=opponent(player), depth=1, last_move_index=move)
+                for move in moves]
+    tree.search_children(tree.root, children, use_pruning=use_pruning)
+    return [child.score for child in children], tree.nodes_visited, tree.transposition_hits, tree.transposition_misses
+
+
+def worker_ready(_=None):
+    """ no-op task used to start the processes of a pool ahead of the first search """
+    return os.getpid()
+
+
+def leaf_model_path(model_path):
+    """ path of the .npz export of a neural net model, for the NeuralNetAccumulator of the leaves """
+    if model_path is not None:
+        npz_path = os.path.splitext(model_path)[0] + ".npz"
+        if os.path.exists(npz_path):
+            return npz_path
+    raise ValueError(f"leaf_weight needs the .npz export of the neural net model, none found for {model_path!r}: "
+                     f"run AI/ExportNumpy.py or pass nn_model_path")
+
+
 class Agent:
-    def __init__(self, player) -> None:
+    def __init__(self, player, use_bitboard=False, transposition_table_entries=2**18, maximum_depth=None,
+                 time_budget=None, maximum_iterative_depth=9, use_pruning=True, workers=1, reuse_tree=None,
+                 max_reused_nodes=200000, streaming=False, evaluation_cache=None, nn_backend="tflite",
+                 leaf_weight=None, nn_threads=None, nn_address=None, nn_model_path=None, use_tree_threshold=0.0,
+                 start_tree_after=4, proof_search_nodes=5000, proof_search_plies=5) -> None:
         """
         Initializes an Agent using a neural network model for decision making.
 
         Args:
             player (Entity): The player type (Entity.black or Entity.white).
+            use_bitboard (bool, optional): Search the tree on BitboardState instead of State. Defaults to False.
+            transposition_table_entries (int, optional): Size of the transposition table kept for the whole game,
+                None disables it. Defaults to 2**18.
+            maximum_depth (int, optional): Depth of the tree when searching without a time budget. Defaults to MaximumDepth.
+            time_budget (float, optional): Seconds per move, counted from the call of choose_move: the proof-number
+                search, the tree and the neural net fallback all fit in it. When set, the tree is deepened
+                iteratively until the budget runs out, see iterative_deepening_search. Defaults to None.
+            maximum_iterative_depth (int, optional): Deepest tree of the iterative deepening. Defaults to 9.
+            use_pruning (bool, optional): Search with Tree.search_tree_pruned, which picks the same move as
+                Tree.search_tree visiting fewer nodes. Defaults to True.
+            workers (int, optional): Number of processes searching the root's children in parallel, the pool
+                is started here and kept for the whole game. Defaults to 1 (search in this process).
+            reuse_tree (bool, optional): Keep the searched tree and re-root it at the next move, see
+                reuse_previous_tree. Not used with workers > 1. Defaults to None: only with a maximum_depth
+                above 3, without a time budget. In a depth 3 tree the kept subtree is one ply deep, the last ply
+                of the next tree, whose children are generated again with the restrictions of that ply, and the
+                shallow iterations of a time budget keep as little, so reuse saves almost nothing there and
+                keeps the old tree in memory between moves.
+            max_reused_nodes (int, optional): Largest subtree kept between moves, larger ones are dropped
+                to cap memory. Defaults to 200000.
+            streaming (bool, optional): Search with lazily expanded trees that only keep their principal
+                line (see Tree), for a small memory footprint. Disables reuse_tree. Defaults to False.
+            evaluation_cache (EvaluationCache, optional): Cache of the neural net scores. The engine and its
+                cache are shared by the whole process (see EngineRegistry.get_engine), so the cache is only
+                used when this agent loads the engine, and a different one raises a ValueError. Defaults to
+                None (the engine's cache).
+            nn_backend (str, optional): "tflite" runs AI/NueralNet2.tflite with the TFLite interpreter, "numpy"
+                runs its weights exported to AI/NueralNet2.npz with NumPy only. Defaults to "tflite".
+            nn_threads (int, optional): Threads of the TFLite interpreter. Defaults to None (TFLite's default).
+            nn_address (str, optional): Address of an InferenceServer (see InferenceServer.start_server) scoring
+                the states instead of a model loaded by this process; nn_backend and nn_threads are then the
+                server's. Defaults to None.
+            nn_model_path (str, optional): Model scoring the states instead of AI/NueralNet2 (a .tflite file, or a
+                .npz file with nn_backend="numpy"). Don't share an evaluation_cache between agents of different
+                models. Defaults to None.
+            use_tree_threshold (float, optional): The move of the tree is played when its score is above this
+                threshold, otherwise the neural net picks the move. Defaults to 0.0.
+            start_tree_after (int, optional): Number of moves picked by the neural net before the tree is
+                searched. Defaults to 4.
+            proof_search_nodes (int, optional): Node budget of the proof-number search run before every move, a
+                proven forced win is played without searching the tree. None disables it. Defaults to 5000.
+            proof_search_plies (int, optional): Horizon of the proofs, see ProofNumberSearch. Defaults to 5.
+            leaf_weight (float, optional): Score the leaves of the tree with the neural net, scaled by this weight
+                (below the win reward, see Tree), using an incremental NeuralNetAccumulator. Defaults to None
+                (leaves that don't end the game score 0). The accumulator loads the .npz export of the model
+                (model.tflite -> model.npz, see AI/ExportNumpy.py), with nn_address the one of nn_model_path;
+                a ValueError is raised when there is none.
         """
-        from NueralNetTFLite import NeuralNetTFLite
-        self.nn_engine = NeuralNetTFLite(model_path=os.path.join("AI","NueralNet2.tflite"))
+        model_path = nn_model_path
+        if nn_address is not None:
+            self.nn_engine = get_engine(nn_address, backend="remote", cache=evaluation_cache)
+        else:
+            if model_path is None:
+                model_path = os.path.join("AI", "NueralNet2.npz" if nn_backend == "numpy" else "NueralNet2.tflite")
+            self.nn_engine = get_engine(model_path, backend=nn_backend, num_threads=nn_threads, cache=evaluation_cache)
+        self.leaf_weight = leaf_weight
+        self.leaf_evaluator = None
+        if leaf_weight is not None:
+            from NueralNetNumpy import NeuralNetAccumulator
+            self.leaf_evaluator = NeuralNetAccumulator(model_path=leaf_model_path(model_path))
         self.player = player
+        self.use_bitboard = use_bitboard
+        self.maximum_depth = maximum_depth if maximum_depth is not None else MaximumDepth
+        self.time_budget = time_budget
+        # seconds of the latest infer_nueral_net calls, the searches leave the slowest of them for the fallback
+        self.nn_move_times = deque([0.05], maxlen=10)
+        self.maximum_iterative_depth = maximum_iterative_depth
+        self.use_pruning = use_pruning
         self.steps_played = 0
-        self.use_tree_threshhold = {Entity.black:0.0, Entity.white:0.0}
-        self.start_tree_after_this_many_moves = {Entity.black: 4, Entity.white: 4}
+        self.use_tree_threshhold = {Entity.black:use_tree_threshold, Entity.white:use_tree_threshold}
+        self.start_tree_after_this_many_moves = {Entity.black: start_tree_after, Entity.white: start_tree_after}
         self.total_time_tree = 0 
         self.tree_use_counter = 0
+        self.transposition_table = None
+        if transposition_table_entries:
+            self.transposition_table = TranspositionTable(max_entries=transposition_table_entries)
+        # history and killer tables, kept for the whole game
+        self.move_ordering = MoveOrdering()
+        # escape routes of the king by position, kept for the whole game
+        self.king_escape_index = KingEscapeIndex()
+        # the proof cache is kept for the whole game
+        self.proof_search = None
+        if proof_search_nodes:
+            self.proof_search = ProofNumberSearch(max_nodes=proof_search_nodes, max_plies=proof_search_plies)
+        self.proved_wins = 0
+        # one dict per tree search: depth, nodes visited, transposition hits/misses and time
+        self.search_log = []
+
+        self.streaming = streaming
+        if reuse_tree is None:
+            reuse_tree = time_budget is None and self.maximum_depth > 3
+        self.reuse_tree = reuse_tree and not streaming
+        self.max_reused_nodes = max_reused_nodes
+        self.previous_tree = None
+        self.previous_move = None
+        self.reused_nodes = 0
+
+        self.workers = workers
+        self.transposition_table_entries = transposition_table_entries
+        self.executor = None
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+            # start the processes now rather than during the first timed move
+            list(self.executor.map(worker_ready, range(workers)))
+
+
+    def close(self):
+        """ shut down the process pool of the parallel search """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
 
 
     def infer_nueral_net(self, state:State):
@@ -286,22 +888,16 @@ class Agent:
         Returns:
             tuple: The best move based on the neural network's prediction.
         """
+        st = time()
         possible_moves = state.possible_moves(self.player)
-        possible_states = []
-        for move_indexes in possible_moves:
-            i, j, new_i, new_j = move_indexes
-            new_board = deepcopy(state.board)
-            new_board[new_i][new_j] = new_board[i][j]
-            new_board[i][j] = State().board[i][j] 
-            
-            new_state = State(new_board, last_move=self.player)
-            new_state.score =self.nn_engine.get_state_score(new_state)
-            possible_states.append(new_state)
+        # the moves are played and taken back on the state, see get_move_scores
+        scores = self.nn_engine.get_move_scores(state, possible_moves)
         
         if self.player == Entity.white:
-            index_of_state = max(enumerate(possible_states), key=lambda x: x[1].score)[0]
+            index_of_state = max(enumerate(scores), key=lambda x: x[1])[0]
         elif self.player == Entity.black:
-            index_of_state = min(enumerate(possible_states), key=lambda x: x[1].score)[0]
+            index_of_state = min(enumerate(scores), key=lambda x: x[1])[0]
+        self.nn_move_times.append(time() - st)
         return possible_moves[index_of_state]
 
 
@@ -316,28 +912,192 @@ class Agent:
             tuple: The best move to play based on the decision-making process (neural network or tree search).
         """
         self.steps_played += 1
+        self.previous_move = self.choose_move(state)
+        return self.previous_move
+
+
+    def search_deadline(self, deadline):
+        """ the deadline of the searches of a move, leaving time for the neural net fallback """
+        if deadline is None:
+            return None
+        return deadline - max(self.nn_move_times)
+
+
+    def choose_move(self, state:State):
+        """ pick the move of play_best_move: a proven win, or the move of the neural net or the tree """
+        # the time budget starts now, the proof search is part of the move
+        deadline = time() + self.time_budget if self.time_budget is not None else None
+        if self.proof_search is not None:
+            proof_state = BitboardState.from_state(state) if self.use_bitboard else state
+            proved, move = self.proof_search.solve(proof_state, self.player, deadline=self.search_deadline(deadline))
+            if proved:
+                self.proved_wins += 1
+                self.previous_tree = None
+                return move
 
         center = (len(state.board) - 1) // 2
         king_in_the_center = state.where_is_king() == (center,center)
             
         if self.steps_played > self.start_tree_after_this_many_moves[self.player]:
             if self.player == Entity.black and king_in_the_center:
+                self.previous_tree = None
                 return self.infer_nueral_net(state)
             
             st = time()
-            tree = Tree(Node(state=state, player=self.player), maximum_depth=MaximumDepth, for_player=self.player)
-            tree.search_tree(node=tree.root)
+            root_node = self.reuse_previous_tree(state)
+            if root_node is None:
+                # the search moves its state in place, so it gets its own copy of the game state
+                root_state = BitboardState.from_state(state) if self.use_bitboard else state.copy()
+                root_node = Node(state=root_state, player=self.player)
+            if self.transposition_table is not None:
+                self.transposition_table.new_search()
+            self.move_ordering.new_search()
+            if self.time_budget is None:
+                tree = self.search(root_node, self.maximum_depth)
+                best_move, root_score = tree.get_best_node(), tree.root.score
+            else:
+                tree, best_move, root_score = self.iterative_deepening_search(root_node,
+                                                                              deadline=self.search_deadline(deadline))
             et = time() - st 
+            self.previous_tree = tree if self.reuse_tree else None
             
             self.tree_use_counter += 1
             self.total_time_tree += et
 
-            if tree.root.score > self.use_tree_threshhold[self.player]:
-                return tree.get_best_node()
+            if best_move is not None and root_score > self.use_tree_threshhold[self.player]:
+                return best_move
             else:
                 return self.infer_nueral_net(state)
         else:
             return self.infer_nueral_net(state)
 
+
+    def reuse_previous_tree(self, state:State):
+        """
+        Re-root the tree of the previous move at the position the game has reached since.
+
+        The tree searched for the previous move already holds our move and the opponent's
+        replies below it. The grandchild matching the current position (found by playing the
+        replies on the tree's state and comparing the Zobrist hash and the board) becomes the
+        new root and the rest of the old tree is released. The kept subtree is extended by the
+        next search instead of being rebuilt.
+
+        Args:
+            state (State): The current state of the game.
+
+        Returns:
+            Node: The new root, or None if the tree cannot be reused (no previous tree, the reply
+                was never expanded, or the subtree has more than max_reused_nodes nodes).
+        """
+        tree, move = self.previous_tree, self.previous_move
+        self.previous_tree = None
+        self.reused_nodes = 0
+        if tree is None or self.executor is not None:
+            return None
+        root = tree.root
+        child = next((c for c in root.children if c.last_move_index == move), None)
+        # free the siblings of our move
+        root.children = []
+        if child is None or not child.children:
+            return None
+
+        tree_state = root.state
+        tree_state.make_move(move)
+        for grandchild in child.children:
+            move_record = tree_state.make_move(grandchild.last_move_index)
+            if tree_state.zobrist_hash == state.zobrist_hash and tree_state.board == state.board:
+                break
+            tree_state.unmake_move(move_record)
+        else:
+            return None
+        # free the opponent's other replies
+        child.children = []
+
+        # the kept nodes move two plies up, counting them on the way to enforce the memory cap
+        number_of_nodes = 0
+        nodes = [grandchild]
+        while nodes:
+            node = nodes.pop()
+            node.depth -= 2
+            number_of_nodes += 1
+            if number_of_nodes > self.max_reused_nodes:
+                return None
+            nodes.extend(node.children)
+        grandchild.last_move_index = None
+        self.reused_nodes = number_of_nodes
+        return grandchild
+
+
+    def search(self, root_node:Node, maximum_depth, deadline=None):
+        """
+        Search a Mean-Max tree from the given root.
+
+        Args:
+            root_node (Node): The root to search from, its state is moved in place during the search.
+            maximum_depth (int): Depth of the tree.
+            deadline (float, optional): time() at which the search is aborted. Defaults to None.
+
+        Returns:
+            Tree: The searched tree.
+
+        Raises:
+            SearchTimeout: If the deadline passes before the search is complete.
+        """
+        st = time()
+        tree = Tree(root_node, maximum_depth=maximum_depth, for_player=self.player,
+                    transposition_table=self.transposition_table, deadline=deadline, streaming=self.streaming,
+                    move_ordering=self.move_ordering, leaf_evaluator=self.leaf_evaluator, leaf_weight=self.leaf_weight,
+                    king_escape_index=self.king_escape_index)
+        if self.executor is not None:
+            # two tasks per worker even out the uneven sizes of the subtrees
+            tree.search_root_parallel(self.executor, number_of_tasks=2 * self.workers, use_pruning=self.use_pruning,
+                                      transposition_table_entries=self.transposition_table_entries)
+        elif self.use_pruning:
+            tree.search_tree_pruned(node=tree.root)
+        else:
+            tree.search_tree(node=tree.root)
+        self.search_log.append({"depth": maximum_depth,
+                                "nodes_visited": tree.nodes_visited,
+                                "transposition_hits": tree.transposition_hits,
+                                "transposition_misses": tree.transposition_misses,
+                                "last_plies_skipped": tree.last_plies_skipped,
+                                "reused_nodes": self.reused_nodes,
+                                "time": time() - st})
+        return tree
+
+
+    def iterative_deepening_search(self, root_node:Node, deadline):
+        """
+        Search trees of increasing depth until the deadline, an anytime version of search.
+
+        The depth grows two plies at a time (1, 3, 5, ...), so that the last ply of every tree is
+        played by the agent, as the move restrictions of Node.generate_children expect. An iteration
+        that runs past the deadline is aborted and thrown away; the transposition table and the
+        nodes kept in the tree carry the work of the completed iterations over to the next ones.
+
+        Args:
+            root_node (Node): The root to search from, all iterations extend the same tree.
+            deadline (float): time() at which the search stops.
+
+        Returns:
+            tuple: (tree, best_move, root_score). The tree of the last iteration, and the best move and
+                root score of the last completed one (None, None if none completed).
+        """
+        tree, best_move, root_score = None, None, None
+        maximum_depth = 1
+        while maximum_depth <= self.maximum_iterative_depth:
+            try:
+                tree = self.search(root_node, maximum_depth, deadline=deadline)
+            except SearchTimeout:
+                break
+            best_move, root_score = tree.get_best_node(), tree.root.score
+            # a move that wins right away cannot be improved by looking deeper
+            if root_score >= 5 * tree.win_reward:
+                break
+            maximum_depth += 2
+        if tree is None:
+            tree = Tree(root_node, for_player=self.player)
+        return tree, best_move, root_score
+
 MaximumDepth = 3
 ...
\ No newline at end of file
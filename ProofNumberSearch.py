@@ -0,0 +1,166 @@
+from Utils import Entity
+from TranspositionTable import TranspositionTable
+from Rules import apply_move, undo_move, opponent
+from time import time
+
+INFINITY = float("inf")
+
+
+class ProofNode:
+    __slots__ = ("move", "attacker_to_move", "remaining", "proof", "disproof", "children")
+
+    def __init__(self, move, attacker_to_move, remaining, proof=1, disproof=1) -> None:
+        """
+        A node of the proof-number search.
+
+        Args:
+            move (tuple): The move leading to the node, None at the root.
+            attacker_to_move (bool): OR node (the attacker picks one move) or AND node (every move of
+                the defender must lose).
+            remaining (int): Plies left before the horizon.
+            proof (float, optional): Proof number, the least number of leaves to prove to win. Defaults to 1.
+            disproof (float, optional): Disproof number, the least number of leaves to disprove. Defaults to 1.
+        """
+        self.move = move
+        self.attacker_to_move = attacker_to_move
+        self.remaining = remaining
+        self.proof = proof
+        self.disproof = disproof
+        self.children = None
+
+    def update(self):
+        """ recompute the proof and disproof numbers from the children """
+        if self.attacker_to_move:
+            self.proof = min(child.proof for child in self.children)
+            self.disproof = sum(child.disproof for child in self.children)
+        else:
+            self.proof = sum(child.proof for child in self.children)
+            self.disproof = min(child.disproof for child in self.children)
+
+
+class ProofNumberSearch:
+    def __init__(self, max_nodes=20000, max_plies=5, cache_entries=2**16) -> None:
+        """
+        Proves forced wins of the side to move: king escapes for white, king captures for black.
+
+        The search is a proof-number search bounded by a horizon of max_plies plies: a position not
+        won by then counts as disproved, so a disproof only means "no forced win within max_plies".
+        It keeps expanding the most-proving node, the one whose proof or disproof settles the root
+        with the fewest expansions, until the root is proved, disproved or max_nodes nodes were
+        created. A single state is moved in place along the path of the node being expanded.
+
+        On the attacker's last ply only the moves that can end the game are tried: king moves for
+        white, moves landing next to the king for black. This can miss a win by blocking the
+        defender, never prove a wrong one.
+
+        Solved positions are kept in a TranspositionTable keyed by (Zobrist hash, plies left,
+        attacker), shared by the searches of the whole game.
+
+        Args:
+            max_nodes (int, optional): Node budget of one search. Defaults to 20000.
+            max_plies (int, optional): Horizon of the proofs, odd so the attacker plays the last ply. Defaults to 5.
+            cache_entries (int, optional): Slots of the proof cache. Defaults to 2**16.
+        """
+        self.max_nodes = max_nodes
+        self.max_plies = max_plies
+        self.cache = TranspositionTable(max_entries=cache_entries)
+        self.nodes = 0
+
+    def solve(self, state, player, deadline=None):
+        """
+        Look for a forced win of the player to move.
+
+        Args:
+            state (State or BitboardState): The position, moved in place and restored.
+            player (Entity): The player to move, the attacker.
+            deadline (float, optional): time() at which the search gives up, checked before every expansion.
+                Defaults to None (only the node budget bounds the search).
+
+        Returns:
+            tuple: (result, move). result is True if a win within max_plies is proved, move being its first
+                move; False if it is disproved; None if the node budget or the time ran out first.
+        """
+        self.nodes = 0
+        self.cache.new_search()
+        root = ProofNode(None, True, self.max_plies)
+        while root.proof and root.disproof and self.nodes < self.max_nodes:
+            if deadline is not None and time() > deadline:
+                break
+            path, records = [root], []
+            node = root
+            # descend to the most-proving node
+            while node.children is not None:
+                if node.attacker_to_move:
+                    node = min(node.children, key=lambda child: child.proof)
+                else:
+                    node = min(node.children, key=lambda child: child.disproof)
+                records.append(apply_move(state, self.player_at(player, node), node.move, check_blocked=False)[0])
+                path.append(node)
+            self.expand(state, player, node)
+            # back the numbers up to the root, taking the moves back on the way
+            for k in range(len(path) - 1, -1, -1):
+                # a node without moves keeps the numbers expand gave it
+                if path[k].children:
+                    path[k].update()
+                if path[k].proof == 0 or path[k].disproof == 0:
+                    self.cache.store(self.cache_key(state, path[k], player), path[k].proof == 0, path[k].remaining)
+                if k:
+                    undo_move(state, records[k - 1])
+
+        if root.proof == 0:
+            return True, next(child.move for child in root.children if child.proof == 0)
+        if root.disproof == 0:
+            return False, None
+        return None, None
+
+    @staticmethod
+    def player_at(attacker, node):
+        """ the player who played the move leading to a node """
+        return opponent(attacker) if node.attacker_to_move else attacker
+
+    @staticmethod
+    def cache_key(state, node, attacker):
+        return (state.zobrist_hash, node.remaining, attacker)
+
+    def expand(self, state, attacker, node):
+        """
+        Create the children of a node, proving or disproving those that end the game or reach the
+        horizon. The state holds the node's position.
+        """
+        player = attacker if node.attacker_to_move else opponent(attacker)
+        moves = self.candidate_moves(state, player, node)
+        node.children = []
+        if not moves:
+            # a player without a move loses, so do the attacker's hopeless last plies
+            node.proof, node.disproof = (INFINITY, 0) if node.attacker_to_move else (0, INFINITY)
+            return
+        for move in moves:
+            child = ProofNode(move, not node.attacker_to_move, node.remaining - 1)
+            record, winner = apply_move(state, player, move, check_blocked=False)
+            if winner is not None:
+                child.proof, child.disproof = (0, INFINITY) if winner == attacker else (INFINITY, 0)
+            elif child.remaining == 0:
+                child.proof, child.disproof = INFINITY, 0
+            else:
+                proved = self.cache.lookup(self.cache_key(state, child, attacker))
+                if proved is not None:
+                    child.proof, child.disproof = (0, INFINITY) if proved else (INFINITY, 0)
+            undo_move(state, record)
+            node.children.append(child)
+            self.nodes += 1
+            # one winning move proves an OR node and one escape disproves an AND node, the other moves
+            # don't matter
+            if (node.attacker_to_move and child.proof == 0) or (not node.attacker_to_move and child.disproof == 0):
+                node.children = [child]
+                break
+        node.update()
+
+    @staticmethod
+    def candidate_moves(state, player, node):
+        """ the moves of a node, only those that can end the game on the attacker's last ply """
+        if node.remaining > 1 or not node.attacker_to_move:
+            return state.possible_moves(player)
+        king_i, king_j = state.where_is_king()
+        if player == Entity.white:
+            return state.possible_moves_for_index(king_i, king_j)
+        return [move for move in state.possible_moves(player) if abs(move[2] - king_i) + abs(move[3] - king_j) == 1]
@@ -0,0 +1,66 @@
+"""
+The rules of a move, for State and BitboardState: playing it with its captures, and deciding whether
+it ends the game. Nothing here needs a TablutGame or Pygame, so the game, the search (Player.Tree),
+the self-play workers and the benchmarks all apply moves the same way.
+"""
+from Utils import Entity
+
+
+def opponent(player):
+    """ the player moving after `player`, the king moves for white """
+    return Entity.white if player == Entity.black else Entity.black
+
+
+def has_legal_move(state, player):
+    """ whether the player can move at all, a player who can't loses """
+    return bool(state.possible_moves(player))
+
+
+def game_winner(state, player, new_i, new_j, check_blocked=True):
+    """
+    Decide whether the move that just landed on (new_i, new_j) ended the game.
+
+    Args:
+        state (State or BitboardState): The position after the move.
+        player (Entity): The player who moved.
+        new_i (int): Row of the moved piece.
+        new_j (int): Column of the moved piece.
+        check_blocked (bool, optional): Also check that the opponent has a move left, which generates
+            its moves. The search leaves it out, a blocked player is found when its node is expanded
+            (see Player.Tree.score_blocked).
+            Defaults to True.
+
+    Returns:
+        Entity: Entity.black if the king was captured, Entity.white if it escaped, the player if the
+            opponent is left without a move, None if the game goes on.
+    """
+    if state.if_black_captured_king(new_i, new_j):
+        return Entity.black
+    if state.if_king_escaped(new_i, new_j):
+        return Entity.white
+    if check_blocked and not has_legal_move(state, opponent(player)):
+        return player
+    return None
+
+
+def apply_move(state, player, move, check_blocked=True):
+    """
+    Play a move in place, with its captures, and decide whether it ended the game.
+
+    Args:
+        state (State or BitboardState): The position, moved in place.
+        player (Entity): The player moving.
+        move (tuple): (i, j, new_i, new_j).
+        check_blocked (bool, optional): See game_winner. Defaults to True.
+
+    Returns:
+        tuple: The MoveRecord to pass to undo_move, and the winner (None if the game goes on).
+    """
+    record = state.make_move(move)
+    return record, game_winner(state, player, move[2], move[3], check_blocked)
+
+
+def undo_move(state, record):
+    """ take back a move played with apply_move, restoring its captures """
+    state.unmake_move(record)
+
@@ -0,0 +1,97 @@
+"""
+Play games headless (see TablutGame's headless option) across a pool of processes and write their logs
+in the self-play format read by AI/ReadyDataset.py, one file per game as soon as it ends.
+
+Run from the repository root:
+    python SelfPlay.py --games 100 --white agent --black agent --workers 4 --max-moves 200
+    python SelfPlay.py --games 100 --white next_best_nn --black random --server
+
+The neural net and the agents are deterministic, so every game starts with --opening-plies random moves
+drawn from its own seed (--seed plus the game number): games differ, and each can be replayed from the
+seed written in the name of its log.
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+from TablutGame import TablutGame, PlayMode
+
+PLAY_MODES = {"random": PlayMode.random, "next_best_nn": PlayMode.next_best_nn, "agent": PlayMode.agent}
+
+
+def play_game(w_play_mode, b_play_mode, max_moves, nn_address=None, seed=None, opening_plies=0):
+    """
+    Play one headless game.
+
+    Returns:
+        tuple: The winner, the number of moves, the game log and its file name.
+    """
+    game = TablutGame(w_play_mode, b_play_mode, headless=True, max_moves=max_moves, nn_address=nn_address,
+                      seed=seed, opening_plies=opening_plies)
+    winner = game.play_game()
+    return winner, len(game.records) - 1, game.game_log(), game.game_log_filename()
+
+
+def self_play(games, w_play_mode, b_play_mode, save_dir, workers=1, max_moves=None, nn_address=None, seed=0,
+              opening_plies=4):
+    """
+    Play games in a process pool and save each log as it arrives.
+
+    Args:
+        games (int): Number of games.
+        w_play_mode (PlayMode): Play mode of white.
+        b_play_mode (PlayMode): Play mode of black.
+        save_dir (str): Folder of the game logs.
+        workers (int, optional): Processes playing games. Defaults to 1.
+        max_moves (int, optional): Games are draws after this many moves. Defaults to None (no limit).
+        nn_address (str, optional): Address of an InferenceServer shared by the workers. Defaults to None.
+        seed (int, optional): Seed of the first game, game k is played with seed + k. Defaults to 0.
+        opening_plies (int, optional): Random moves played at the start of every game. Defaults to 4.
+
+    Returns:
+        dict: Number of games and moves, the winners and the elapsed seconds.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    results = {"games": 0, "moves": 0, "winners": {}, "seconds": 0.0}
+    st = perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_game, w_play_mode, b_play_mode, max_moves, nn_address, seed + game, opening_plies)
+                   for game in range(games)]
+        for future in as_completed(futures):
+            winner, moves, log, filename = future.result()
+            # games ending in the same second get the same name, the game number makes it unique
+            with open(os.path.join(save_dir, f"{results['games']}_{filename}"), "w") as file:
+                file.write(log)
+            results["games"] += 1
+            results["moves"] += moves
+            results["winners"][winner] = results["winners"].get(winner, 0) + 1
+    results["seconds"] = perf_counter() - st
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--white", choices=PLAY_MODES, default="agent")
+    parser.add_argument("--black", choices=PLAY_MODES, default="agent")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-moves", type=int, default=300, help="games are draws after this many moves")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, the next ones count up")
+    parser.add_argument("--opening-plies", type=int, default=4, help="random moves played at the start of each game")
+    parser.add_argument("--save-dir", default=os.path.join("AI", "GameRecords", "RecordsDataset"))
+    parser.add_argument("--server", action="store_true",
+                        help="score the states with one InferenceServer shared by the workers")
+    args = parser.parse_args()
+
+    server, nn_address = None, None
+    if args.server:
+        from InferenceServer import start_server
+        server, nn_address = start_server(os.path.join("AI", "NueralNet2.tflite"))
+    results = self_play(args.games, PLAY_MODES[args.white], PLAY_MODES[args.black], args.save_dir,
+                        workers=args.workers, max_moves=args.max_moves, nn_address=nn_address, seed=args.seed,
+                        opening_plies=args.opening_plies)
+    if server is not None:
+        server.terminate()
+    print(f"{results['games']} games, {results['moves']} moves in {results['seconds']:.1f} s: "
+          f"{results['games'] / results['seconds']:.2f} games/s, {results['moves'] / results['seconds']:.1f} moves/s")
+    print("winners:", ", ".join(f"{winner} {count}" for winner, count in sorted(results["winners"].items())))
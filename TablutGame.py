@@ -1,11 +1,10 @@
 from Utils import Entity, State, LastMoves
-from copy import deepcopy
 import random
-from time import sleep
-import pygame 
+from time import sleep, perf_counter
 from Utils import CELL_SIZE
 import datetime, os
-from NueralNetTFLite import NeuralNetTFLite
+from EngineRegistry import get_engine
+from Rules import apply_move
 from Player import Agent
 
 
@@ -25,7 +24,9 @@ class TablutGame:
     ['O', '*', '*', 'B', 'B', 'B', '*', '*', 'O']
     ]
 
-    def __init__(self, w_play_mode, b_play_mode, save_game_log=False) -> None:
+    def __init__(self, w_play_mode, b_play_mode, save_game_log=False, headless=False, max_moves=None,
+                 save_dir=os.path.join("AI", "GameRecords"), nn_address=None, w_agent_kwargs=None,
+                 b_agent_kwargs=None, seed=None, opening_plies=0) -> None:
         """
         Initialize the Tablut game and Pygame for visualization.
 
@@ -36,10 +37,26 @@ class TablutGame:
             w_play_mode (PlayMode): Play mode for the white player.
             b_play_mode (PlayMode): Play mode for the black player.
             save_game_log (bool, optional): Flag to enable game log saving. Defaults to False.
+            headless (bool, optional): Don't initialize Pygame nor print the result, the game is played with
+                step or play_game (see SelfPlay.py). PlayMode.user needs a display. Defaults to False.
+            max_moves (int, optional): The game is a draw after this many moves. Defaults to None (no limit).
+            save_dir (str, optional): Folder of the game logs. Defaults to AI/GameRecords.
+            nn_address (str, optional): Address of an InferenceServer scoring the states of the neural net
+                and the agents. Defaults to None (the model is loaded by this process).
+            w_agent_kwargs (dict, optional): Arguments of white's Agent (PlayMode.agent), e.g. maximum_depth or
+                nn_model_path (see Tournament.py). Defaults to None.
+            b_agent_kwargs (dict, optional): Arguments of black's Agent. Defaults to None.
+            seed (int, optional): Seed of the random moves of the game (PlayMode.random and the opening), the
+                other play modes are deterministic: games of the same seed are the same. It is written in
+                the name of the game log. Defaults to None (not reproducible).
+            opening_plies (int, optional): Number of random moves played first, whatever the play modes,
+                so that games between deterministic players differ. Defaults to 0.
 
         Returns:
             None
         """
+        if headless and PlayMode.user in (w_play_mode, b_play_mode):
+            raise ValueError("PlayMode.user needs a display, it can't be played headless")
         self.w_play_mode , self.b_play_mode = w_play_mode, b_play_mode
         play_mode_functions = {
             PlayMode.user : self.user_play,
@@ -49,13 +66,23 @@ class TablutGame:
         }
         self.w_play_function = play_mode_functions[w_play_mode]
         self.b_play_function = play_mode_functions[b_play_mode]
+        # the neural net and the agents are only created by the play modes that use them, the engine of
+        # the neural net and its cache of scores are shared with the agents (see EngineRegistry.get_engine)
         if self.w_play_function == self.neural_net or self.b_play_function == self.neural_net:
-            self.nn_engine = NeuralNetTFLite(model_path=os.path.join("AI","NueralNet2.tflite"))
+            if nn_address is not None:
+                self.nn_engine = get_engine(nn_address, backend="remote")
+            else:
+                self.nn_engine = get_engine(os.path.join("AI","NueralNet2.tflite"))
+        def agent_kwargs(kwargs):
+            return {"nn_address": nn_address, **(kwargs or {})}
         if self.w_play_function == self.play_agent:
-            self.agent_w = Agent(player=Entity.white)
+            self.agent_w = Agent(player=Entity.white, **agent_kwargs(w_agent_kwargs))
         if self.b_play_function == self.play_agent:
-            self.agent_b = Agent(player=Entity.black)
+            self.agent_b = Agent(player=Entity.black, **agent_kwargs(b_agent_kwargs))
 
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.opening_plies = opening_plies
         self.records = []
         self.state = State(TablutGame.initial_state, last_move=LastMoves.initial_state)
         self.board_size = len(self.state.board)
@@ -64,8 +91,16 @@ class TablutGame:
         self.current_player = Entity.white
         self.winner = None
         self.if_save_game_log = save_game_log
+        self.save_dir = save_dir
+        self.headless = headless
+        self.max_moves = max_moves
+        # seconds taken by each move of the players, see step
+        self.move_times = {Entity.white: [], Entity.black: []}
+        if headless:
+            return
 
         # Initialize Pygame
+        import pygame
         pygame.init()
         self.cell_size = CELL_SIZE
         # Set up the Pygame window
@@ -82,23 +117,13 @@ class TablutGame:
             A tuple representing the move indexes (i, j, new_i, new_j).
         """
         possible_moves = self.state.possible_moves(for_player=for_player)
-        return random.choice(possible_moves)
+        return self.random.choice(possible_moves)
 
-    def save_game_log(self):
+    def game_log(self):
         """
-        Save the game log including move history and winner information to a text file.
-
-        This method generates a string containing the move history and winner information
-        from the game records and saves it to a text file. It includes details about each move,
-        the board state after each move, and the final winner of the game.
-
-        The file is named based on the winner, timestamp, move count, and player modes used during the game.
-
-        Args:
-            self: The Game instance to which this method belongs.
+        Return the game log, the self-play format read by AI/ReadyDataset.py.
 
-        Returns:
-            None
+        It includes details about each move, the board state after each move, and the final winner of the game.
         """
         string = ""
         for state in self.records:
@@ -110,60 +135,37 @@ class TablutGame:
             string += board_str
             string += "\n-\n"
         string += f"winner: {self.winner}"
+        return string
 
-        # Get the current timestamp
+    def game_log_filename(self, suffix=""):
+        """ name of the game log: the winner, timestamp, move count, player modes used during the game and seed """
         timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        # Define the filename with the timestamp
-        save_dir = r"AI\GameRecords"
-        os.makedirs(save_dir, exist_ok=True)
-        filename = f"{self.winner}_{timestamp}_{str(len(self.records))}_b{self.b_play_mode[0]}_w{self.w_play_mode[0]}.txt"
-        # Convert the string and save it to the file
-        with open(os.path.join(save_dir, filename), "w") as file:
-            file.write(string)
+        if self.seed is not None:
+            suffix = f"_s{self.seed}{suffix}"
+        return f"{self.winner}_{timestamp}_{str(len(self.records))}_b{self.b_play_mode[0]}_w{self.w_play_mode[0]}{suffix}.txt"
 
-
-    def run_visualization(self):
+    def save_game_log(self):
         """
-        Run the Pygame visualization of the game board.
+        Save the game log including move history and winner information to a text file in save_dir.
+
+        The file is named based on the winner, timestamp, move count, and player modes used during the game.
+
+        Args:
+            self: The Game instance to which this method belongs.
+
+        Returns:
+            None
         """
-        self.state.pygame_visualize(self.screen)
+        os.makedirs(self.save_dir, exist_ok=True)
+        with open(os.path.join(self.save_dir, self.game_log_filename()), "w") as file:
+            file.write(self.game_log())
 
 
-    def check_if_move_captures(self, i, j):
+    def run_visualization(self):
         """
-        Check for piece captures in multiple directions based on the last move.
-        Args:
-            i: Row index of the moved piece.
-            j: Column index of the moved piece.
-        This function checks for piece captures in four directions (right, left, down, up). 
-        It updates the board based on the last player's move and captured pieces.
+        Run the Pygame visualization of the game board.
         """
-        possible_directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-        if self.current_player == LastMoves.white:
-            invalid_squares_for_capture = [Entity.square, Entity.escape, Entity.camp]
-            capture_with_help_of = [Entity.castle, Entity.king, Entity.white]
-        elif self.current_player == LastMoves.black:
-            invalid_squares_for_capture = [Entity.square, Entity.escape, Entity.king]
-            capture_with_help_of = [Entity.black, Entity.camp]
-
-        for rl, ud in possible_directions:
-            counter = 0
-            passed_squares = []
-            while True:
-                counter += 1
-                new_i = i + counter*ud  
-                new_j = j + counter*rl
-                if not self.state.check_if_index_is_inside_board(new_i, new_j): break
-                if self.state.board[new_i][new_j] in invalid_squares_for_capture: 
-                    break
-                
-                elif self.state.board[new_i][new_j] in capture_with_help_of:
-                    for sq in passed_squares:
-                        col, row = sq
-                        self.state.board[col][row] = State().board[col][row]
-                    break
-                
-                passed_squares.append((new_i, new_j))
+        self.state.pygame_visualize(self.screen)
 
 
     def game_over(self, winner=None):
@@ -188,14 +190,13 @@ class TablutGame:
         
         self.records.append(self.state)
         if not winner:
-            print("Draw")
             self.winner = 'D'
         elif winner == Entity.black:
-            print("Black Wins")
             self.winner = Entity.black
         elif winner == Entity.white:
             self.winner = Entity.white
-            print("White wins.")
+        if not self.headless:
+            print({'D': "Draw", Entity.black: "Black Wins", Entity.white: "White wins."}[self.winner])
         self.game_finished = True
 
         # tree_use_counterS += self.agent_w.tree_use_counter
@@ -225,31 +226,6 @@ class TablutGame:
             return Entity.white 
 
 
-    @staticmethod
-    def make_new_state(state:State, current_player, move_indexes:tuple):
-        """
-        Create a new game state based on a provided move for the current player.
-
-        This static method generates a new game state by simulating a move on the board.
-        It takes the current state, the current player, and the move indexes to determine
-        the piece movement and creates a new state reflecting the consequences of that move.
-
-        Args:
-            state (State): The current game state.
-            current_player: The Entity representing the current player (Entity.white or Entity.black).
-            move_indexes (tuple): A tuple containing the indexes of the move (i, j, new_i, new_j).
-
-        Returns:
-            State: A new game state reflecting the result of the move.
-        """
-        i, j, new_i, new_j = move_indexes
-        new_state = deepcopy(state.board)
-        new_state[new_i][new_j] = new_state[i][j]
-        new_state[i][j] = State().board[i][j] 
-        state = State(new_state, last_move=current_player)
-        return state 
-        
-
     def change_player_turn(self):
         """ toggle whos turn it is """
         self.current_player = TablutGame.who_is_opponent_of(self.current_player)
@@ -263,34 +239,15 @@ class TablutGame:
             move_indexes: A tuple representing the move indexes (i, j, new_i, new_j).
             moved_by: The player who made the move.
         """
-        i, j, new_i, new_j = move_indexes
         self.records.append(self.state)
-        self.state = TablutGame.make_new_state(self.state, self.current_player, move_indexes=move_indexes)
-        self.check_if_move_captures(new_i, new_j)
-        self.check_game_has_winner(new_i, new_j)
+        # records keep the previous states, so the move is played on a copy
+        self.state = self.state.copy()
+        _, winner = apply_move(self.state, self.current_player, move_indexes)
+        if winner is not None:
+            self.game_over(winner)
         self.change_player_turn()
 
 
-    def if_next_player_can_move(self):
-        """ If next player cannot do any moves, return False """
-        who_plays_next = TablutGame.who_is_opponent_of(self.current_player)
-        possible_moves_for_next_player = self.state.possible_moves(who_plays_next)
-        if not possible_moves_for_next_player:
-            return False 
-        return True
-
-
-    def check_game_has_winner(self, i, j):
-        """Checks if the last move has made anyone winner of the game
-
-        Args:
-            i (_type_): x position of the last move
-            j (_type_): y position of the last move
-        """        
-        if self.state.if_black_captured_king(i, j): self.game_over(Entity.black)
-        if self.state.if_king_escaped(i, j): self.game_over(Entity.white)
-        if not self.if_next_player_can_move(): self.game_over(self.current_player)
-
     def white_move(self):
         self.w_play_function()
 
@@ -302,8 +259,8 @@ class TablutGame:
         Uses a neural network-based decision-making process to determine the next move for the current player.
 
         This function evaluates the possible moves available to the current player based on the current game state.
-        For each possible move, it creates a new board state by simulating the move and evaluates the resulting state
-        using a neural network-based scoring system. The move with the highest (for white) or lowest (for black) score
+        Each possible move is played on the state, encoded into a row of the batch and taken back, and the
+        resulting states are evaluated together by the neural network (get_move_scores, one invoke per batch). The move with the highest (for white) or lowest (for black) score
         is chosen as the best move and applied to update the game board.
 
         It iterates through all possible moves, evaluates them using the neural network, and selects the move with
@@ -311,21 +268,13 @@ class TablutGame:
         """
     
         possible_moves = self.state.possible_moves(self.current_player)
-        possible_states = []
-        for move_indexes in possible_moves:
-            i, j, new_i, new_j = move_indexes
-            new_board = deepcopy(self.state.board)
-            new_board[new_i][new_j] = new_board[i][j]
-            new_board[i][j] = State().board[i][j] 
-            
-            new_state = State(new_board, last_move=self.current_player)
-            new_state.score =self.nn_engine.get_state_score(new_state)   
-            possible_states.append(new_state)
+        # the moves are played and taken back on the state, see get_move_scores
+        scores = self.nn_engine.get_move_scores(self.state, possible_moves)
         
         if self.current_player == Entity.white:
-            index_of_state = max(enumerate(possible_states), key=lambda x: x[1].score)[0]
+            index_of_state = max(enumerate(scores), key=lambda x: x[1])[0]
         elif self.current_player == Entity.black:
-            index_of_state = min(enumerate(possible_states), key=lambda x: x[1].score)[0]
+            index_of_state = min(enumerate(scores), key=lambda x: x[1])[0]
         self.update_board(possible_moves[index_of_state])
 
 
@@ -358,6 +307,7 @@ class TablutGame:
         by drawing semi-transparent colored squares.
         """
         # wait for user to play
+        import pygame
         def draw_rect_alpha(surface, color, rect):
             shape_surf = pygame.Surface(pygame.Rect(rect).size, pygame.SRCALPHA)
             pygame.draw.rect(shape_surf, color, shape_surf.get_rect())
@@ -395,13 +345,34 @@ class TablutGame:
 
     def play(self):
         """ run visualization and play next move """
+        import pygame
         sleep(0.001)
         self.run_visualization()
-        if self.current_player == Entity.white:
+        self.step()
+        pygame.display.flip()
+
+    def step(self):
+        """ play the next move, without rendering; the game is a draw once max_moves moves are played """
+        player, moves_played = self.current_player, len(self.records)
+        st = perf_counter()
+        if moves_played < self.opening_plies:
+            self.random_play()
+        elif player == Entity.white:
             self.white_move() 
-        elif self.current_player == Entity.black:
+        elif player == Entity.black:
             self.black_move()
-        pygame.display.flip()
+        # the user's turn takes many steps, only the step playing the move is timed; the random opening
+        # moves aren't the player's
+        if len(self.records) != moves_played and moves_played >= self.opening_plies:
+            self.move_times[player].append(perf_counter() - st)
+        if not self.game_finished and self.max_moves is not None and len(self.records) >= self.max_moves:
+            self.game_over()
+
+    def play_game(self):
+        """ play the game to its end without rendering and return the winner (Entity, or 'D' for a draw) """
+        while not self.game_finished:
+            self.step()
+        return self.winner
 
 
 class PlayMode:   
@@ -412,6 +383,7 @@ class PlayMode:
 
 
 if __name__=="__main__":
+    import pygame
     while True:
         game = TablutGame(w_play_mode=PlayMode.user, b_play_mode=PlayMode.agent, save_game_log=False)
         while not game.game_finished:
@@ -0,0 +1,229 @@
+"""
+Play a tournament between player configurations, headless across a pool of processes, and report
+their results: score with a Wilson confidence interval per pairing, Elo ratings, and the
+distribution of their think time per move against the time limit.
+
+A configuration is a play mode and, for PlayMode.agent, the arguments of its Agent. The built-in
+configurations are listed in PLAYERS; more can be given in a JSON file mapping names to
+{"mode": "random" | "next_best_nn" | "agent", "agent": {Agent arguments}}.
+
+Formats:
+    round-robin   every pair of players meets
+    gauntlet      the first player meets each of the others
+Every pairing plays --games games, the players alternating colors. The neural net and the agents
+are deterministic, so games start with --opening-plies random moves: every two games of a pairing
+share a seeded opening, played once with each color. Without openings (--opening-plies 0) the games
+of two deterministic players repeat, and more than 2 per pairing are refused.
+
+The models of the agents (nn_model_path) must exist: agent_int8 needs AI/Quantized/model5_int8.tflite,
+written by AI/QuantizeModel.py.
+
+Run from the repository root:
+    python Tournament.py --players agent_d3 agent_d2 next_best_nn random --games 10 --workers 4
+    python Tournament.py --format gauntlet --players agent_int8 agent_d3 --config players.json
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from TablutGame import TablutGame, PlayMode
+from Utils import Entity
+
+PLAY_MODES = {"random": PlayMode.random, "next_best_nn": PlayMode.next_best_nn, "agent": PlayMode.agent}
+
+PLAYERS = {
+    "random": {"mode": "random"},
+    "next_best_nn": {"mode": "next_best_nn"},
+    "agent_d2": {"mode": "agent", "agent": {"maximum_depth": 2}},
+    "agent_d3": {"mode": "agent", "agent": {"maximum_depth": 3}},
+    "agent_d3_threshold": {"mode": "agent", "agent": {"maximum_depth": 3, "use_tree_threshold": 0.5}},
+    "agent_numpy": {"mode": "agent", "agent": {"nn_backend": "numpy"}},
+    "agent_int8": {"mode": "agent", "agent": {"nn_model_path": os.path.join("AI", "Quantized", "model5_int8.tflite")}},
+    "agent_time_budget": {"mode": "agent", "agent": {"time_budget": 5.0}},
+}
+
+
+def pairings_of(players, tournament_format="round-robin"):
+    """ return the (a, b) pairs of players meeting in a tournament """
+    if tournament_format == "round-robin":
+        return list(itertools.combinations(players, 2))
+    if tournament_format == "gauntlet":
+        return [(players[0], opponent) for opponent in players[1:]]
+    raise ValueError(f"Unknown tournament format: {tournament_format}")
+
+
+def schedule(players, games, tournament_format="round-robin", seed=0):
+    """
+    Return the (white, black, seed) of every game. Colors alternate within each pairing, and the two
+    games of each color swap share the seed of their opening, every opening of the tournament has its own.
+    """
+    openings_per_pairing = (games + 1) // 2
+    return [((a, b) if k % 2 == 0 else (b, a)) + (seed + p * openings_per_pairing + k // 2,)
+            for p, (a, b) in enumerate(pairings_of(players, tournament_format)) for k in range(games)]
+
+
+def is_deterministic(configuration):
+    """ whether a player configuration always plays the same move in a position """
+    return configuration["mode"] != "random"
+
+
+def missing_models(players, configurations):
+    """ return the (player, path) of the agents whose nn_model_path doesn't exist """
+    paths = [(player, configurations[player].get("agent", {}).get("nn_model_path")) for player in players]
+    return [(player, path) for player, path in paths if path is not None and not os.path.exists(path)]
+
+
+def play_game(white, black, configurations, max_moves, seed=None, opening_plies=0):
+    """
+    Play one headless game between two configurations, opening with opening_plies random moves drawn
+    from seed.
+
+    Returns:
+        tuple: The names of white and black, the winner (Entity, or 'D' for a draw), the number of moves
+            and the seconds of each move by player.
+    """
+    w_config, b_config = configurations[white], configurations[black]
+    game = TablutGame(PLAY_MODES[w_config["mode"]], PLAY_MODES[b_config["mode"]], headless=True,
+                      max_moves=max_moves, w_agent_kwargs=w_config.get("agent"), b_agent_kwargs=b_config.get("agent"),
+                      seed=seed, opening_plies=opening_plies)
+    winner = game.play_game()
+    return white, black, winner, len(game.records) - 1, game.move_times
+
+
+def wilson_interval(score, games, z=1.96):
+    """ Wilson score interval of a proportion, draws count as half a win """
+    if games == 0:
+        return 0.0, 1.0
+    p = score / games
+    center = (p + z * z / (2 * games)) / (1 + z * z / games)
+    half_width = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def elo_difference(p):
+    """ Elo difference matching an expected score, clipped at +-800 for 0 and 1 """
+    p = min(max(p, 1e-3), 1 - 1e-3)
+    return max(-800.0, min(800.0, 400 * math.log10(p / (1 - p))))
+
+
+def elo_ratings(players, results, iterations=200):
+    """
+    Maximum likelihood Elo ratings of the players (Bradley-Terry, draws as half a win), centered on 0.
+
+    One virtual draw is added to every pairing, so players winning or losing all their games get a
+    finite rating.
+
+    Args:
+        players (list): The names of the players.
+        results (dict): (a, b) -> [score of a, games], for each pairing.
+
+    Returns:
+        dict: The rating of each player.
+    """
+    ratings = dict.fromkeys(players, 0.0)
+    pairings = {pair: (score + 0.5, games + 1) for pair, (score, games) in results.items()}
+    for _ in range(iterations):
+        for player in players:
+            actual, expected, variance = 0.0, 0.0, 0.0
+            for (a, b), (score, games) in pairings.items():
+                if player not in (a, b):
+                    continue
+                opponent, player_score = (b, score) if player == a else (a, games - score)
+                e = 1 / (1 + 10 ** ((ratings[opponent] - ratings[player]) / 400))
+                actual += player_score
+                expected += games * e
+                variance += games * e * (1 - e)
+            if variance:
+                # Newton step on the log-likelihood
+                ratings[player] += 400 / math.log(10) * (actual - expected) / variance
+        mean = sum(ratings.values()) / len(ratings)
+        ratings = {player: rating - mean for player, rating in ratings.items()}
+    return ratings
+
+
+def tournament(players, configurations, games, tournament_format="round-robin", workers=1, max_moves=300,
+               seed=0, opening_plies=4):
+    """
+    Play the games of a tournament in a process pool, see schedule for the openings.
+
+    Returns:
+        tuple: (a, b) -> [score of a, games] for each pairing, name -> [wins, draws, losses] and
+            name -> the seconds of each of its moves.
+    """
+    results = {}
+    records = {player: [0, 0, 0] for player in players}
+    move_times = {player: [] for player in players}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_game, white, black, configurations, max_moves, game_seed, opening_plies)
+                   for white, black, game_seed in schedule(players, games, tournament_format, seed)]
+        for played, future in enumerate(as_completed(futures), 1):
+            white, black, winner, moves, times = future.result()
+            # pairings are keyed in the order of the player list
+            a, b = (white, black) if players.index(white) < players.index(black) else (black, white)
+            white_score = {Entity.white: 1.0, Entity.black: 0.0, 'D': 0.5}[winner]
+            pairing = results.setdefault((a, b), [0.0, 0])
+            pairing[0] += white_score if a == white else 1 - white_score
+            pairing[1] += 1
+            for player, score in ((white, white_score), (black, 1 - white_score)):
+                records[player][{1.0: 0, 0.5: 1, 0.0: 2}[score]] += 1
+            move_times[white] += times[Entity.white]
+            move_times[black] += times[Entity.black]
+            print(f"{played}/{len(futures)} "
+                  f"{white} vs {black}: {winner} in {moves} moves", flush=True)
+    return results, records, move_times
+
+
+def report(players, results, records, move_times, time_limit):
+    print("\npairing                                   score   95% CI          Elo diff")
+    for (a, b), (score, games) in sorted(results.items()):
+        low, high = wilson_interval(score, games)
+        print(f"{a + ' vs ' + b:<40} {score:>4.1f}/{games:<3} [{low:.2f}, {high:.2f}]  "
+              f"{elo_difference(score / games):>+6.0f} [{elo_difference(low):+.0f}, {elo_difference(high):+.0f}]")
+
+    ratings = elo_ratings(players, results)
+    print(f"\n{'player':<22} {'Elo':>6} {'W-D-L':>10} {'moves':>6} {'p50 s':>7} {'p95 s':>7} {'max s':>7} {'> limit':>7}")
+    for player in sorted(players, key=lambda player: -ratings[player]):
+        wins, draws, losses = records[player]
+        times = np.array(move_times[player]) if move_times[player] else np.zeros(1)
+        print(f"{player:<22} {ratings[player]:>+6.0f} {f'{wins}-{draws}-{losses}':>10} {len(move_times[player]):>6} "
+              f"{np.percentile(times, 50):>7.3f} {np.percentile(times, 95):>7.3f} {times.max():>7.3f} "
+              f"{int((times > time_limit).sum()):>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", nargs="+", default=["agent_d3", "agent_d2", "next_best_nn", "random"])
+    parser.add_argument("--config", help="JSON file of more player configurations")
+    parser.add_argument("--format", choices=["round-robin", "gauntlet"], default="round-robin")
+    parser.add_argument("--games", type=int, default=10, help="games per pairing, colors alternate")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-moves", type=int, default=300, help="games are draws after this many moves")
+    parser.add_argument("--time-limit", type=float, default=60.0, help="seconds allowed per move")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first opening, the next ones count up")
+    parser.add_argument("--opening-plies", type=int, default=4,
+                        help="random moves opening each game, every opening is played with both colors")
+    args = parser.parse_args()
+
+    configurations = dict(PLAYERS)
+    if args.config:
+        with open(args.config) as file:
+            configurations.update(json.load(file))
+    unknown = [player for player in args.players if player not in configurations]
+    if unknown:
+        parser.error(f"unknown players: {', '.join(unknown)}")
+    missing = missing_models(args.players, configurations)
+    if missing:
+        parser.error("missing models: " + ", ".join(f"{player} ({path})" for player, path in missing)
+                     + ", see AI/QuantizeModel.py and AI/ExportNumpy.py")
+    repeated = [f"{a} vs {b}" for a, b in pairings_of(args.players, args.format)
+                if is_deterministic(configurations[a]) and is_deterministic(configurations[b])]
+    if args.opening_plies == 0 and args.games > 2 and repeated:
+        parser.error(f"{', '.join(repeated)} would play the same 2 games over again without openings: "
+                     "use --opening-plies or --games 2")
+    results, records, move_times = tournament(args.players, configurations, args.games, args.format,
+                                              workers=args.workers, max_moves=args.max_moves, seed=args.seed,
+                                              opening_plies=args.opening_plies)
+    report(args.players, results, records, move_times, args.time_limit)
@@ -0,0 +1,87 @@
+
+# Rough size of one stored entry (the slot tuple, its key tuple and the ints in them) in CPython
+ENTRY_SIZE_BYTES = 240
+
+
+class TranspositionTable:
+    def __init__(self, max_entries=2**18) -> None:
+        """
+        Fixed size table of Mean-Max scores, shared by the searches of one player during a game.
+
+        Keys are tuples that start with the Zobrist hash of the position, see Tree.transposition_key.
+        Each key maps to one slot (hash % max_entries). When two keys compete for a slot, the new
+        entry replaces the old one if the old one was stored during an earlier search, or if the
+        new one covers at least as many remaining plies ("depth-preferred" replacement).
+
+        Args:
+            max_entries (int, optional): Number of slots, this caps the memory used by the table. Defaults to 2**18.
+        """
+        self.max_entries = max_entries
+        self.slots = [None] * max_entries
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+        self.rejections = 0
+
+    @classmethod
+    def from_megabytes(cls, megabytes):
+        """ create a table whose entries take about `megabytes` MB once it is full """
+        return cls(max_entries=max(1, int(megabytes * 2**20 / ENTRY_SIZE_BYTES)))
+
+    def new_search(self):
+        """ mark the start of a new search, entries of older searches become replaceable """
+        self.generation += 1
+
+    def lookup(self, key):
+        """
+        Return the stored score of a key, or None if it is not in the table.
+
+        Args:
+            key (tuple): (zobrist_hash, ...) key of the node.
+        """
+        entry = self.slots[key[0] % self.max_entries]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def store(self, key, score, remaining_depth):
+        """
+        Store the score of a fully searched node.
+
+        Args:
+            key (tuple): (zobrist_hash, ...) key of the node.
+            score (float): The Mean-Max score of the node.
+            remaining_depth (int): Number of plies searched below the node.
+        """
+        index = key[0] % self.max_entries
+        entry = self.slots[index]
+        if entry is not None and entry[0] != key:
+            if entry[3] == self.generation and entry[2] > remaining_depth:
+                self.rejections += 1
+                return
+            self.replacements += 1
+        self.slots[index] = (key, score, remaining_depth, self.generation)
+        self.stores += 1
+
+    def clear(self):
+        """ empty the table, counters are kept """
+        self.slots = [None] * self.max_entries
+
+    def stats(self):
+        """ return the counters of the table as a dict """
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "stores": self.stores,
+            "replacements": self.replacements,
+            "rejections": self.rejections,
+            "filled": sum(entry is not None for entry in self.slots),
+            "max_entries": self.max_entries,
+        }
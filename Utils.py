@@ -1,7 +1,6 @@
-from PIL import Image, ImageDraw
 import math 
-import pygame
 import os 
+import random
 
 CELL_SIZE = 60 
 
@@ -39,20 +38,75 @@ class LastMoves:
     initial_state = "I"
 
 def resize_image(original_image):
+    import pygame
     # Scale the image to fit within the cell size while maintaining aspect ratio
     return pygame.transform.scale(original_image, (CELL_SIZE, CELL_SIZE))
 
 assets_path = "Assets"
-SquareImage = {
-    # "W": image of white piece
-    Entity.white: resize_image(pygame.image.load(os.path.join(assets_path, "w.png"))),
-    Entity.black: resize_image(pygame.image.load(os.path.join(assets_path, "b.png"))),
-    Entity.king: resize_image(pygame.image.load(os.path.join(assets_path, "k.png"))),
-    Entity.square: resize_image(pygame.image.load(os.path.join(assets_path, "e.png"))),
-    Entity.escape: resize_image(pygame.image.load(os.path.join(assets_path, "escape.png"))),
-    Entity.castle: resize_image(pygame.image.load(os.path.join(assets_path, "castle.png"))),
-    Entity.camp: resize_image(pygame.image.load(os.path.join(assets_path, "camp.png")))
-}
+# "W": image of white piece, ... loaded by get_square_images on the first render
+SquareImage = {}
+
+def get_square_images():
+    """load and scale the images of the squares once, only games that render need pygame"""
+    if not SquareImage:
+        import pygame
+        SquareImage.update({
+            Entity.white: resize_image(pygame.image.load(os.path.join(assets_path, "w.png"))),
+            Entity.black: resize_image(pygame.image.load(os.path.join(assets_path, "b.png"))),
+            Entity.king: resize_image(pygame.image.load(os.path.join(assets_path, "k.png"))),
+            Entity.square: resize_image(pygame.image.load(os.path.join(assets_path, "e.png"))),
+            Entity.escape: resize_image(pygame.image.load(os.path.join(assets_path, "escape.png"))),
+            Entity.castle: resize_image(pygame.image.load(os.path.join(assets_path, "castle.png"))),
+            Entity.camp: resize_image(pygame.image.load(os.path.join(assets_path, "camp.png")))
+        })
+    return SquareImage
+
+EMPTY_BOARD = [
+    ['O', '*', '*', '0', '0', '0', '*', '*', 'O'],
+    ['*', 'O', 'O', 'O', '0', 'O', 'O', 'O', '*'],
+    ['*', 'O', 'O', 'O', 'O', 'O', 'O', 'O', '*'],
+    ['0', 'O', 'O', 'O', 'O', 'O', 'O', 'O', '0'],
+    ['0', '0', 'O', 'O', '+', 'O', 'O', '0', '0'],
+    ['0', 'O', 'O', 'O', 'O', 'O', 'O', 'O', '0'],
+    ['*', 'O', 'O', 'O', 'O', 'O', 'O', 'O', '*'],
+    ['*', 'O', 'O', 'O', '0', 'O', 'O', 'O', '*'],
+    ['O', '*', '*', '0', '0', '0', '*', '*', 'O']
+    ]
+
+### Zobrist keys: one random 64-bit number per (piece, square) and one for "black to move".
+# The seed is fixed so that hashes agree between processes and runs.
+_zobrist_random = random.Random(20240101)
+ZOBRIST_PIECES = {piece: [_zobrist_random.getrandbits(64) for _ in range(81)]
+                  for piece in (Entity.white, Entity.black, Entity.king)}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+def zobrist_piece_hash(board):
+    """ hash of the piece placement of a 9x9 board, from scratch """
+    piece_hash = 0
+    for i, row in enumerate(board):
+        for j, cell in enumerate(row):
+            if cell in ZOBRIST_PIECES:
+                piece_hash ^= ZOBRIST_PIECES[cell][i*9 + j]
+    return piece_hash
+#####################################################################################
+
+class MoveRecord:
+    def __init__(self, move_indexes, piece, last_move, captured, piece_hash=0) -> None:
+        """
+        Everything State.unmake_move needs to take back a move made by State.make_move.
+
+        Args:
+            move_indexes (tuple): The move that was made (i, j, new_i, new_j).
+            piece (Entity): The piece that moved.
+            last_move (LastMoves): The last_move of the state before the move.
+            captured (list): (i, j, piece) of every piece removed by the move.
+            piece_hash (int, optional): The piece_hash of the state before the move. Defaults to 0.
+        """
+        self.move_indexes = move_indexes
+        self.piece = piece
+        self.last_move = last_move
+        self.captured = captured
+        self.piece_hash = piece_hash
 
 class State:
 
@@ -66,20 +120,37 @@ class State:
         """
         self.last_move = last_move
         if not state:
-            self.board = [
-            ['O', '*', '*', '0', '0', '0', '*', '*', 'O'],
-            ['*', 'O', 'O', 'O', '0', 'O', 'O', 'O', '*'],
-            ['*', 'O', 'O', 'O', 'O', 'O', 'O', 'O', '*'],
-            ['0', 'O', 'O', 'O', 'O', 'O', 'O', 'O', '0'],
-            ['0', '0', 'O', 'O', '+', 'O', 'O', '0', '0'],
-            ['0', 'O', 'O', 'O', 'O', 'O', 'O', 'O', '0'],
-            ['*', 'O', 'O', 'O', 'O', 'O', 'O', 'O', '*'],
-            ['*', 'O', 'O', 'O', '0', 'O', 'O', 'O', '*'],
-            ['O', '*', '*', '0', '0', '0', '*', '*', 'O']
-            ]
+            self.board = [row[:] for row in EMPTY_BOARD]
         else: 
             self.board = state
         self.score = None
+        self.piece_hash = zobrist_piece_hash(self.board)
+        # square of the king, kept by make_move / unmake_move, see where_is_king
+        self.king_position = None
+
+
+    @property
+    def zobrist_hash(self):
+        """
+        64-bit Zobrist key of the position: piece placement and side to move.
+        The piece part is kept up to date by make_move, unmake_move and capture_pieces;
+        call rehash() after editing the board directly.
+        """
+        if self.last_move == LastMoves.white:
+            return self.piece_hash ^ ZOBRIST_BLACK_TO_MOVE
+        return self.piece_hash
+
+
+    def rehash(self):
+        """ recompute piece_hash from the board """
+        self.piece_hash = zobrist_piece_hash(self.board)
+
+
+    def copy(self):
+        """ return a new State with its own copy of the board """
+        new_state = State([row[:] for row in self.board], last_move=self.last_move)
+        new_state.king_position = self.king_position
+        return new_state
 
 
     def __str__(self) -> str:
@@ -106,10 +177,20 @@ class State:
     
 
     def where_is_king(self):
-        """reutnr position of king"""
+        """
+        Return the position of the king, None if it is not on the board.
+
+        The position is kept by make_move and unmake_move. The board is only scanned when the
+        cached square no longer holds the king, after the board was edited directly.
+        """
+        king = self.king_position
+        if king is not None and self.board[king[0]][king[1]] == Entity.king:
+            return king
+        self.king_position = None
         for i in range(len(self.board)):
             for j in range(len(self.board[0])):
                 if self.board[i][j] == Entity.king:
+                    self.king_position = (i,j)
                     return (i,j)
 
 
@@ -125,7 +206,7 @@ class State:
             bool: True if the king has escaped, False otherwise.
         """
         if self.last_move == LastMoves.white:
-            if self.board[i][j] == Entity.king and State().board[i][j] == Entity.escape:
+            if self.board[i][j] == Entity.king and EMPTY_BOARD[i][j] == Entity.escape:
                     return True
         return False
     
@@ -234,6 +315,95 @@ class State:
                 else: break
         return possible_states
     
+    def capture_pieces(self, i, j, player):
+        """
+        Remove the pieces captured by a piece of `player` that has just landed on (i, j).
+
+        Walking away from the moved piece in every direction, a line of opponent pieces is
+        captured when it is closed by a friendly piece or by a square that helps the capture
+        (castle, king and white pieces for white; camps and black pieces for black).
+
+        Args:
+            i (int): Row index of the moved piece.
+            j (int): Column index of the moved piece.
+            player (Entity): The player who made the move (Entity.white or Entity.black).
+
+        Returns:
+            list: (i, j, piece) of every captured piece.
+        """
+        possible_directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+        if player == Entity.white:
+            invalid_squares_for_capture = [Entity.square, Entity.escape, Entity.camp]
+            capture_with_help_of = [Entity.castle, Entity.king, Entity.white]
+        elif player == Entity.black:
+            invalid_squares_for_capture = [Entity.square, Entity.escape, Entity.king]
+            capture_with_help_of = [Entity.black, Entity.camp]
+
+        captured = []
+        for rl, ud in possible_directions:
+            counter = 0
+            passed_squares = []
+            while True:
+                counter += 1
+                new_i = i + counter*ud  
+                new_j = j + counter*rl
+                if not self.check_if_index_is_inside_board(new_i, new_j): break
+                if self.board[new_i][new_j] in invalid_squares_for_capture: 
+                    break
+                
+                elif self.board[new_i][new_j] in capture_with_help_of:
+                    for row, col in passed_squares:
+                        if self.board[row][col] != EMPTY_BOARD[row][col]:
+                            captured.append((row, col, self.board[row][col]))
+                            self.piece_hash ^= ZOBRIST_PIECES[self.board[row][col]][row*9 + col]
+                            self.board[row][col] = EMPTY_BOARD[row][col]
+                    break
+                
+                passed_squares.append((new_i, new_j))
+        return captured
+
+
+    def make_move(self, move_indexes:tuple):
+        """
+        Play a move in place, including the captures it makes.
+
+        Args:
+            move_indexes (tuple): The move to play (i, j, new_i, new_j).
+
+        Returns:
+            MoveRecord: The record to pass to unmake_move to take the move back.
+        """
+        i, j, new_i, new_j = move_indexes
+        piece = self.board[i][j]
+        player = Entity.black if piece == Entity.black else Entity.white
+        record = MoveRecord(move_indexes, piece, self.last_move, None, self.piece_hash)
+        self.board[new_i][new_j] = piece
+        self.board[i][j] = EMPTY_BOARD[i][j]
+        self.piece_hash ^= ZOBRIST_PIECES[piece][i*9 + j] ^ ZOBRIST_PIECES[piece][new_i*9 + new_j]
+        self.last_move = player
+        if piece == Entity.king:
+            self.king_position = (new_i, new_j)
+        record.captured = self.capture_pieces(new_i, new_j, player)
+        return record
+
+
+    def unmake_move(self, record:MoveRecord):
+        """
+        Take back a move played with make_move, restoring the captured pieces.
+
+        Args:
+            record (MoveRecord): The record returned by make_move.
+        """
+        i, j, new_i, new_j = record.move_indexes
+        for row, col, piece in record.captured:
+            self.board[row][col] = piece
+        self.board[i][j] = record.piece
+        self.board[new_i][new_j] = EMPTY_BOARD[new_i][new_j]
+        self.last_move = record.last_move
+        self.piece_hash = record.piece_hash
+        if record.piece == Entity.king:
+            self.king_position = (i, j)
+
     def pygame_visualize(self, screen):
         """
         Visualize the game state using Pygame.
@@ -241,10 +411,12 @@ class State:
         Args:
             screen: Pygame screen object.
         """
+        import pygame
+        square_images = get_square_images()
         for row in range(len(self.board)):
             for col in range(len(self.board[0])):
                 piece = self.board[row][col]
-                piece_image = SquareImage[piece]
+                piece_image = square_images[piece]
                 piece_rect = piece_image.get_rect()
                 piece_rect.topleft = (col * CELL_SIZE, row * CELL_SIZE)
                 screen.blit(piece_image, piece_rect)
@@ -256,6 +428,7 @@ class State:
         Visualize the game board using Pillow (PIL) library.
         Displays the board using the default image viewer.
         """
+        from PIL import Image, ImageDraw
         white_img_path = Image.open(r"D:\tablut_bot\Assets\w.png")
         black_img_path = Image.open(r"D:\tablut_bot\Assets\b.png")
         king_img_path = Image.open(r"D:\tablut_bot\Assets\k.png")
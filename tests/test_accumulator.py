@@ -0,0 +1,49 @@
+"""
+NeuralNetAccumulator against the full forward pass of NeuralNetNumpy, along random games played and
+taken back with its make_move / unmake_move.
+"""
+import os
+import random
+import sys
+import pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from Utils import State, Entity, LastMoves
+from BitboardState import BitboardState
+from TablutGame import TablutGame
+from NueralNetNumpy import NeuralNetNumpy, NeuralNetAccumulator
+from Rules import opponent
+
+MODEL_PATH = os.path.join(ROOT, "AI", "NueralNet2.npz")
+
+
+@pytest.mark.parametrize("backend", ["state", "bitboard"])
+def test_accumulator_matches_forward_pass(backend):
+    engine = NeuralNetNumpy(model_path=MODEL_PATH)
+    accumulator = NeuralNetAccumulator(model_path=MODEL_PATH)
+    rng = random.Random(0)
+    captures = 0
+    for _ in range(5):
+        state = State([row[:] for row in TablutGame.initial_state], last_move=LastMoves.initial_state)
+        if backend == "bitboard":
+            state = BitboardState.from_state(state)
+        accumulator.reset(state)
+        start_score = accumulator.evaluate()
+        player, records, scores = Entity.white, [], []
+        for _ in range(40):
+            moves = state.possible_moves(player)
+            if not moves or state.where_is_king() is None:
+                break
+            records.append(accumulator.make_move(state, rng.choice(moves)))
+            captures += len(records[-1].captured)
+            scores.append(accumulator.evaluate())
+            assert scores[-1] == pytest.approx(engine.get_state_score(state), abs=1e-5)
+            player = opponent(player)
+        # taking the moves back restores every accumulator on the way
+        while records:
+            assert accumulator.evaluate() == pytest.approx(scores.pop(), abs=1e-6)
+            accumulator.unmake_move(state, records.pop())
+            assert accumulator.evaluate() == pytest.approx(engine.get_state_score(state), abs=1e-5)
+        assert accumulator.evaluate() == pytest.approx(start_score, abs=1e-6)
+    # the games capture pieces, whose rows the accumulator subtracts
+    assert captures
@@ -0,0 +1,20 @@
+"""
+Game logs read back by AI/ReadyDataset.py: the states keep the hashes of the positions of the game.
+"""
+import os
+import sys
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from TablutGame import TablutGame, PlayMode
+from AI.ReadyDataset import convert_dataset_txt_to_record
+
+
+def test_self_play_log_states_are_hashed(tmp_path):
+    game = TablutGame(PlayMode.random, PlayMode.random, headless=True, max_moves=20, seed=0)
+    game.play_game()
+    log_path = tmp_path / game.game_log_filename()
+    log_path.write_text(game.game_log())
+    record = convert_dataset_txt_to_record(str(log_path), self_play=True)
+    assert record is not None
+    assert [state.piece_hash for state in record.states] == [state.piece_hash for state in game.records]
+    assert len({state.piece_hash for state in record.states}) > 1
@@ -0,0 +1,22 @@
+"""
+Perft counts of Benchmarks/Perft.py up to depth 2, on State and BitboardState: a change of the move
+generation or of the captures that changes a count fails here. Deeper counts are checked with
+    python Benchmarks/Perft.py --depth 4 --verify
+"""
+import os
+import sys
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Benchmarks"))
+from Perft import POSITIONS, REFERENCE_COUNTS, make_state, perft
+
+
+@pytest.mark.parametrize("backend", ["state", "bitboard"])
+@pytest.mark.parametrize("position", list(POSITIONS))
+@pytest.mark.parametrize("depth", [1, 2])
+def test_perft(position, depth, backend):
+    state, player = make_state(position, backend)
+    piece_hash = state.piece_hash
+    assert perft(state, player, depth) == REFERENCE_COUNTS[(position, depth)]
+    # every move was taken back
+    assert state.piece_hash == piece_hash
@@ -0,0 +1,66 @@
+"""
+ProofNumberSearch against an exhaustive AND/OR search of the same horizon, on random positions: a
+proof must be a forced win, its move must win, and a disproof must leave no forced win.
+"""
+import os
+import sys
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Benchmarks"))
+from BitboardState import BitboardState
+from ProofNumberSearch import ProofNumberSearch
+from Rules import apply_move, undo_move, opponent
+from SearchPruning import random_positions
+
+PLIES = 3
+
+
+def forced_win(state, attacker, player, plies):
+    """ whether the attacker wins within plies plies whatever the defender plays, player to move """
+    moves = state.possible_moves(player)
+    if not moves:
+        return player != attacker
+    for move in moves:
+        record, winner = apply_move(state, player, move, check_blocked=False)
+        if winner is not None:
+            won = winner == attacker
+        elif plies == 1:
+            won = False
+        else:
+            won = forced_win(state, attacker, opponent(player), plies - 1)
+        undo_move(state, record)
+        if player == attacker and won:
+            return True
+        if player != attacker and not won:
+            return False
+    return player != attacker
+
+
+def move_wins(state, attacker, move, plies):
+    """ whether the attacker's move forces a win within plies plies """
+    record, winner = apply_move(state, attacker, move, check_blocked=False)
+    if winner is not None:
+        won = winner == attacker
+    else:
+        won = plies > 1 and forced_win(state, attacker, opponent(attacker), plies - 1)
+    undo_move(state, record)
+    return won
+
+
+@pytest.mark.parametrize("backend", ["state", "bitboard"])
+def test_no_false_proofs(backend):
+    proofs = 0
+    for plies_played in (20, 60):
+        for state, player in random_positions(10, plies_played, seed=plies_played):
+            if backend == "bitboard":
+                state = BitboardState.from_state(state)
+            zobrist_hash = state.zobrist_hash
+            result, move = ProofNumberSearch(max_nodes=10**6, max_plies=PLIES).solve(state, player)
+            assert state.zobrist_hash == zobrist_hash
+            # the search could only miss a win by blocking the defender on the last ply, none of these positions has one
+            assert result == forced_win(state, player, player, PLIES)
+            if result:
+                proofs += 1
+                assert move_wins(state, player, move, PLIES)
+    # some of the positions are forced wins, so proofs are checked too
+    assert proofs
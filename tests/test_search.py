@@ -0,0 +1,49 @@
+"""
+Scores of the Mean-Max search (Player.Tree): a player left without a move loses, and the Star1 pruned
+search picks the same root move with the same root score as the plain one.
+"""
+import os
+import sys
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Benchmarks"))
+from Utils import State, Entity, EMPTY_BOARD
+from Player import Node, Tree
+from SearchPruning import random_positions, run_search
+
+
+def blocked_black_position():
+    """ white to move: (0, 2, 0, 1) leaves black's only piece in the corner without a move, the king can't move """
+    board = [row[:] for row in EMPTY_BOARD]
+    board[0][0] = Entity.black
+    board[1][0] = Entity.white
+    board[0][2] = Entity.white
+    board[4][4] = Entity.king
+    for i, j in ((3, 4), (5, 4), (4, 3), (4, 5)):
+        board[i][j] = Entity.white
+    return State(board, last_move=Entity.black)
+
+
+@pytest.mark.parametrize("pruned", [False, True])
+@pytest.mark.parametrize("streaming", [False, True])
+def test_blocked_player_loses(pruned, streaming):
+    root = Node(state=blocked_black_position(), player=Entity.white)
+    tree = Tree(root, maximum_depth=3, for_player=Entity.white, streaming=streaming)
+    if pruned:
+        tree.search_tree_pruned(root)
+    else:
+        tree.search_tree(root)
+    assert tree.get_best_node() == (0, 2, 0, 1)
+    assert root.score == tree.win_reward * 5
+
+
+# mid-game positions, and late ones where wins stop the search of the siblings
+@pytest.mark.parametrize("plies", [12, 60])
+@pytest.mark.parametrize("position", range(4))
+def test_pruned_search_matches_plain_search(plies, position):
+    state, player = random_positions(4, plies, seed=plies)[position]
+    plain_move, plain_score, plain_nodes, _ = run_search(state, player, 3, pruned=False)
+    pruned_move, pruned_score, pruned_nodes, _ = run_search(state, player, 3, pruned=True)
+    assert pruned_move == plain_move
+    assert pruned_score == pytest.approx(plain_score)
+    assert pruned_nodes <= plain_nodes